@@ -2,13 +2,16 @@
 import os
 import logging
 import sys
-from src.config import BASE_PATH, ENV_PATH, DB_PATH, LOGS_PATH, api_status, logger
+from src.config import BASE_PATH, ENV_PATH, DB_PATH, LOGS_PATH, api_status, logger, configure
 from src.interface import create_gradio_interface
 
 def main():
     """Основная функция для запуска приложения"""
     print("Запуск StudyPal...")
     
+    # Настраиваем директории, логирование и API ключи
+    configure()
+    
     # Выводим статус API
     print("\nСтатус API ключей:")
     for api, status in api_status.items():
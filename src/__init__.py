@@ -1,4 +1,56 @@
 # src/__init__.py
+
+
+class BlockTable:
+    """Subtitle blocks stored column-wise (struct of arrays)
+
+    Each block field lives in its own list, so scans over one field (for
+    example the table of contents) walk a contiguous column. Indexing and
+    iteration return row dicts with the same keys as the original block
+    dicts, so existing readers keep working.
+    """
+    def __init__(self, start_times=None, end_times=None, titles=None,
+                 subtitles=None, content_texts=None, is_chapter=None):
+        self.start_times = start_times or []
+        self.end_times = end_times or []
+        self.titles = titles or []
+        self.subtitles = subtitles or []
+        self.content_texts = content_texts or []
+        self.is_chapter = is_chapter or [False] * len(self.start_times)
+
+    @classmethod
+    def from_blocks(cls, blocks):
+        """Build a table from a list of block dicts"""
+        return cls(
+            start_times=[block["start_time"] for block in blocks],
+            end_times=[block["end_time"] for block in blocks],
+            titles=[block.get("title", "") for block in blocks],
+            subtitles=[block.get("subtitles", []) for block in blocks],
+            content_texts=[block.get("content_text", "") for block in blocks],
+            is_chapter=[block.get("is_youtube_chapter", False) for block in blocks]
+        )
+
+    def __len__(self):
+        return len(self.start_times)
+
+    def row(self, index):
+        """Return block `index` as a dict"""
+        return {
+            "start_time": self.start_times[index],
+            "end_time": self.end_times[index],
+            "title": self.titles[index],
+            "subtitles": self.subtitles[index],
+            "content_text": self.content_texts[index],
+            "is_youtube_chapter": self.is_chapter[index]
+        }
+
+    def __getitem__(self, index):
+        return self.row(index)
+
+    def __iter__(self):
+        return (self.row(i) for i in range(len(self)))
+
+
 class AppState:
     """Global application state"""
     def __init__(self):
@@ -6,9 +58,8 @@ class AppState:
         self.video_info = {}
         self.vectordb = None
         self.qa_chain = None
-        self.chat_history = []
         self.current_model = "huggingface"
-        self.subtitle_blocks = []
+        self.subtitle_blocks = BlockTable()
         self.table_of_contents = ""
         self.use_youtube_chapters = True
 
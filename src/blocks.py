@@ -1,17 +1,113 @@
+import re
+import bisect
+import asyncio
 import logging
-import nltk
+import functools
+import numpy as np
 from typing import List, Dict, Any
-from tqdm.notebook import tqdm
+from tqdm.auto import tqdm
 from collections import Counter
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize, sent_tokenize
-from src.config import logger, APP_SETTINGS
-from src import app_state
+from concurrent.futures import ThreadPoolExecutor
+from src.config import logger, APP_SETTINGS, api_status
+from src import app_state, BlockTable
 from src.utils import format_time
+from src.processing import save_video_metadata
 from src.youtube import get_youtube_chapters, get_youtube_video_chapters_api
 
 
-def analyze_subtitles_into_blocks(subtitles, min_block_duration=60, min_pause_threshold=3, max_block_size=25):
+# Дополнительные общие стоп-слова разговорной речи
+_ADDITIONAL_STOPWORDS = frozenset({'yeah', 'uh', 'um', 'oh', 'like', 'just', 'so', 'know', 'think', 'well', 'going',
+                                   'get', 'got', 'actually', 'okay', 'right', 'thing', 'things', 'gonna', 'wanna'})
+
+
+@functools.lru_cache(maxsize=None)
+def _get_stop_words():
+    """
+    Возвращает объединенные стоп-слова английского и русского языков
+    
+    NLTK импортируется и загружает ресурсы только при первом вызове,
+    результат кэшируется на все время работы процесса.
+    """
+    import nltk
+    from nltk.corpus import stopwords
+    
+    # Загрузка стоп-слов NLTK
+    try:
+        nltk.data.find('corpora/stopwords')
+    except LookupError:
+        nltk.download('stopwords', quiet=True)
+    
+    stop_words = set(_ADDITIONAL_STOPWORDS)
+    for language in ('english', 'russian'):
+        try:
+            stop_words.update(stopwords.words(language))
+        except Exception as e:
+            logger.warning(f"Could not load {language} stopwords: {e}")
+    
+    return frozenset(stop_words)
+
+
+# Все символы, кроме букв и цифр (для очистки слов от пунктуации)
+_NON_ALNUM_RE = re.compile(r'[\W_]+', re.UNICODE)
+
+# Слова из букв длиной от 3 символов (для подсчета ключевых слов)
+_WORD_RE = re.compile(r"[^\W\d_]{3,}", re.UNICODE)
+
+# Граница предложения (нужно только первое предложение)
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+')
+
+
+def _count_keywords(text):
+    """
+    Подсчитывает частоту ключевых слов в тексте без учета стоп-слов
+    
+    Args:
+        text: Текст в нижнем регистре
+        
+    Returns:
+        Counter с частотой каждого ключевого слова
+    """
+    # Считаем все слова сразу (подсчет выполняется на C), затем удаляем
+    # стоп-слова из словаря, а не проверяем каждое вхождение слова
+    word_counts = Counter(_WORD_RE.findall(text))
+    for word in _get_stop_words().intersection(word_counts):
+        del word_counts[word]
+    return word_counts
+
+
+def _top_keywords(word_counts, k):
+    """
+    Выбирает k самых частых слов, встречающихся больше одного раза
+    
+    Результат совпадает с most_common(k) (включая порядок слов с одинаковой
+    частотой), но вместо полной сортировки словаря выполняется частичная.
+    
+    Args:
+        word_counts: Counter с частотой слов
+        k: Количество слов
+        
+    Returns:
+        Список слов по убыванию частоты
+    """
+    words = list(word_counts)
+    counts = np.fromiter(word_counts.values(), dtype=np.int64, count=len(words))
+    
+    # Слова, встречающиеся только один раз, не считаются ключевыми
+    candidates = np.flatnonzero(counts > 1)
+    
+    if len(candidates) > k:
+        # Порог — k-я по величине частота; оставляем все слова не ниже порога
+        candidate_counts = counts[candidates]
+        threshold = np.partition(candidate_counts, len(candidates) - k)[len(candidates) - k]
+        candidates = candidates[candidate_counts >= threshold]
+    
+    # Устойчивая сортировка сохраняет порядок первого появления при равной частоте
+    order = candidates[np.argsort(-counts[candidates], kind="stable")][:k]
+    return [words[j] for j in order]
+
+
+def analyze_subtitles_into_blocks(subtitles, min_block_duration=60, min_pause_threshold=3, max_block_size=25,
+                                  generate_titles=True):
     """
     Разбивает субтитры на логические блоки на основе контента и временных меток
     
@@ -20,69 +116,82 @@ def analyze_subtitles_into_blocks(subtitles, min_block_duration=60, min_pause_th
         min_block_duration: Минимальная продолжительность блока в секундах
         min_pause_threshold: Минимальный порог паузы для разделения блоков в секундах
         max_block_size: Максимальное количество субтитров в одном блоке
+        generate_titles: Генерировать ли заголовки блоков (False, если вызывающий код сделает это сам)
         
     Returns:
         Список блоков, где каждый блок содержит список субтитров и метаданные
     """
-    if not subtitles or len(subtitles) < 5:
+    if not subtitles:
+        # Без субтитров возвращаем один пустой блок
+        return [{
+            "start_time": 0,
+            "end_time": 0,
+            "subtitles": subtitles,
+            "content_text": "",
+            "title": "Весь контент"
+        }]
+    
+    if len(subtitles) < 5:
         # Если субтитров мало, возвращаем один блок
+        last = subtitles[-1]
         return [{
-            "start_time": subtitles[0]["start"] if subtitles else 0,
-            "end_time": subtitles[-1]["start"] + subtitles[-1].get("duration", 5) if subtitles else 0,
+            "start_time": subtitles[0]["start"],
+            "end_time": last["start"] + last.get("duration", 5),
             "subtitles": subtitles,
-            "content_text": " ".join([s.get("text", "") for s in subtitles]),
+            "content_text": " ".join(s.get("text", "") for s in subtitles),
             "title": "Весь контент"
         }]
     
+    # Извлекаем поля субтитров за один проход
+    texts = [s.get("text", "") for s in subtitles]
+    starts = [s["start"] for s in subtitles]
+    durations = [s.get("duration", 5) for s in subtitles]
+    last_index = len(subtitles) - 1
+    
+    # Вычисляем паузы между всеми соседними субтитрами векторно
+    start_array = np.asarray(starts, dtype=np.float64)
+    duration_array = np.asarray(durations, dtype=np.float64)
+    pauses = start_array[1:] - (start_array[:-1] + duration_array[:-1])
+    
+    # Индексы субтитров, после которых есть достаточная пауза (последний субтитр всегда закрывает блок)
+    split_points = np.flatnonzero(pauses >= min_pause_threshold).tolist()
+    split_points.append(last_index)
+    
     blocks = []
-    current_block = []
-    current_block_text = ""
-    
-    for i, subtitle in enumerate(subtitles):
-        # Добавляем текущий субтитр в текущий блок
-        current_block.append(subtitle)
-        current_block_text += " " + subtitle.get("text", "")
-        
-        # Проверяем, нужно ли начать новый блок
-        should_split = False
-        
-        # Проверка на основе паузы
-        if i < len(subtitles) - 1:
-            next_subtitle = subtitles[i + 1]
-            pause_duration = next_subtitle["start"] - (subtitle["start"] + subtitle.get("duration", 5))
-            if pause_duration >= min_pause_threshold:
-                should_split = True
-                
-        # Проверка на основе размера блока
-        if len(current_block) >= max_block_size:
-            should_split = True
-            
-        # Создаем новый блок, если нужно разделить
-        if should_split or i == len(subtitles) - 1:
-            if current_block:
-                block_start_time = current_block[0]["start"]
-                block_end_time = current_block[-1]["start"] + current_block[-1].get("duration", 5)
-                
-                # Проверяем минимальную продолжительность блока
-                if block_end_time - block_start_time >= min_block_duration or i == len(subtitles) - 1:
-                    blocks.append({
-                        "start_time": block_start_time,
-                        "end_time": block_end_time,
-                        "subtitles": current_block.copy(),
-                        "content_text": current_block_text.strip(),
-                        "title": ""  # Будет заполнено позже
-                    })
-                    current_block = []
-                    current_block_text = ""
+    block_first = 0  # Индекс первого субтитра текущего блока
+    next_split = 0  # Позиция следующей паузы в split_points
+    i = -1
+    
+    while i < last_index:
+        # Ближайшая точка разделения: по паузе или по размеру блока
+        while split_points[next_split] <= i:
+            next_split += 1
+        i = min(split_points[next_split], max(i + 1, block_first + max_block_size - 1))
+        
+        block_start_time = starts[block_first]
+        block_end_time = starts[i] + durations[i]
+        
+        # Проверяем минимальную продолжительность блока
+        if block_end_time - block_start_time >= min_block_duration or i == last_index:
+            blocks.append({
+                "start_time": block_start_time,
+                "end_time": block_end_time,
+                "subtitles": subtitles[block_first:i + 1],
+                "content_text": " ".join(texts[block_first:i + 1]).strip(),
+                "title": ""  # Будет заполнено позже
+            })
+            block_first = i + 1
     
     # Заполняем заголовки блоков
-    blocks = generate_block_titles(blocks, method="enhanced_keywords")
+    if generate_titles:
+        blocks = generate_block_titles(blocks, method="enhanced_keywords")
     
     return blocks
 
 
 # Модифицированная функция для создания блоков с учетом существующих глав
-def analyze_subtitles_into_blocks_with_chapters(subtitles, video_id, video_info=None, min_block_duration=60):
+def analyze_subtitles_into_blocks_with_chapters(subtitles, video_id, video_info=None, min_block_duration=60,
+                                                generate_titles=True):
     """
     Разбивает субтитры на логические блоки с учетом существующих глав видео
     
@@ -91,6 +200,7 @@ def analyze_subtitles_into_blocks_with_chapters(subtitles, video_id, video_info=
         video_id: ID видео YouTube
         video_info: Информация о видео (опционально)
         min_block_duration: Минимальная продолжительность блока в секундах
+        generate_titles: Генерировать ли заголовки блоков без глав (см. analyze_subtitles_into_blocks)
         
     Returns:
         Список блоков, где каждый блок содержит список субтитров и метаданные
@@ -115,13 +225,15 @@ def analyze_subtitles_into_blocks_with_chapters(subtitles, video_id, video_info=
     if chapters:
         logger.info(f"Using {len(chapters)} chapters from YouTube for blocks")
         
-        # Заполняем отсутствующие времена окончания глав
-        for i, chapter in enumerate(chapters):
+        # Заполняем отсутствующие времена окончания глав: начало следующей главы,
+        # для последней главы — конец видео
+        next_starts = [chapter["start_time"] for chapter in chapters[1:]] + [video_end_time]
+        for chapter, next_start in zip(chapters, next_starts):
             if chapter["end_time"] is None:
-                if i < len(chapters) - 1:
-                    chapter["end_time"] = chapters[i + 1]["start_time"]
-                else:
-                    chapter["end_time"] = video_end_time
+                chapter["end_time"] = next_start
+        
+        # Времена начала субтитров (субтитры упорядочены по времени)
+        subtitle_starts = [s["start"] for s in subtitles]
         
         # Создаем блоки на основе глав
         blocks = []
@@ -129,15 +241,14 @@ def analyze_subtitles_into_blocks_with_chapters(subtitles, video_id, video_info=
             start_time = chapter["start_time"]
             end_time = chapter["end_time"]
             
-            # Фильтруем субтитры для этой главы
-            chapter_subtitles = [
-                s for s in subtitles 
-                if s["start"] >= start_time and s["start"] < end_time
-            ]
+            # Находим субтитры этой главы бинарным поиском
+            lo = bisect.bisect_left(subtitle_starts, start_time)
+            hi = bisect.bisect_left(subtitle_starts, end_time, lo)
+            chapter_subtitles = subtitles[lo:hi]
             
             # Если есть субтитры или продолжительность достаточная, создаем блок
             if chapter_subtitles or (end_time - start_time) >= min_block_duration:
-                content_text = " ".join([s.get("text", "") for s in chapter_subtitles])
+                content_text = " ".join(s.get("text", "") for s in chapter_subtitles)
                 
                 blocks.append({
                     "start_time": start_time,
@@ -151,7 +262,124 @@ def analyze_subtitles_into_blocks_with_chapters(subtitles, video_id, video_info=
     
     # Если главы не найдены, используем стандартный алгоритм
     logger.info("No YouTube chapters found, using automatic block detection")
-    return analyze_subtitles_into_blocks(subtitles, min_block_duration)
+    return analyze_subtitles_into_blocks(subtitles, min_block_duration, generate_titles=generate_titles)
+
+
+def _run_async(coro):
+    """
+    Выполняет корутину и возвращает ее результат
+    
+    Если в текущем потоке уже запущен цикл событий (например, в Jupyter),
+    корутина выполняется в отдельном потоке со своим циклом событий.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
+async def _generate_openai_titles(model, blocks):
+    """
+    Генерирует заголовки блоков через OpenAI с ограниченным числом параллельных запросов
+    
+    Args:
+        model: Модель ChatOpenAI
+        blocks: Список блоков субтитров (заголовки заполняются на месте)
+    """
+    semaphore = asyncio.Semaphore(APP_SETTINGS["title_generation_concurrency"])
+    progress = tqdm(total=len(blocks), desc="Generating titles with OpenAI")
+    
+    async def generate_title(block):
+        content = block["content_text"]
+        
+        # Ограничиваем длину текста для API
+        if len(content) > 2000:
+            content = content[:2000] + "..."
+        
+        try:
+            async with semaphore:
+                response = await model.ainvoke(
+                    f"Generate a concise, informative title (5-10 words) for this text segment from a video: '{content}'"
+                )
+            block["title"] = response.content.strip().strip('"\'')
+        except Exception as e:
+            logger.warning(f"Error generating title with OpenAI: {e}")
+            # Fallback to simpler method
+            first_words = " ".join(content.split()[:7])
+            block["title"] = first_words + "..."
+        finally:
+            progress.update(1)
+    
+    try:
+        await asyncio.gather(*(generate_title(block) for block in blocks))
+    finally:
+        progress.close()
+
+
+@functools.lru_cache(maxsize=512)
+def _enhanced_title(text):
+    """
+    Формирует заголовок блока по первой фразе и ключевым словам текста
+    
+    Результат кэшируется по тексту блока: повторяющиеся фрагменты
+    (вступления, концовки, повторная обработка видео) не анализируются заново.
+    
+    Args:
+        text: Текст блока
+        
+    Returns:
+        Заголовок или None, если из текста не удалось извлечь полезную информацию
+    """
+    text = text.lower()
+    
+    # Получаем первое предложение
+    sentences = _SENTENCE_END_RE.split(text, maxsplit=1)
+    first_sentence = sentences[0] if sentences else ""
+    
+    # Очищаем первое предложение (берем не более 7 слов)
+    clean_first_words = []
+    for word in first_sentence.split()[:7]:
+        # Очищаем от пунктуации
+        clean_word = _NON_ALNUM_RE.sub('', word)
+        if clean_word and len(clean_word) > 1:
+            clean_first_words.append(clean_word)
+    
+    first_phrase = " ".join(clean_first_words)
+    
+    # Находим ключевые слова из всего блока
+    word_counts = _count_keywords(text)
+    top_words = _top_keywords(word_counts, 4)
+    
+    # Формируем заголовок
+    if top_words and first_phrase:
+        # Используем первую фразу и топ-ключевые слова
+        if len(first_phrase) > 30:
+            first_phrase = first_phrase[:30] + "..."
+        
+        key_words = ", ".join(top_words[:3]) if top_words else ""
+        
+        # Объединяем части в заголовок
+        title = first_phrase.capitalize()
+        if key_words:
+            title += f" [{key_words}]"
+    elif first_phrase:
+        # Используем только первую фразу
+        title = first_phrase.capitalize()
+    elif top_words:
+        # Используем только ключевые слова
+        title = "Topic: " + ", ".join(top_words[:4])
+    else:
+        # Не удалось извлечь полезную информацию
+        return None
+    
+    # Ограничиваем длину заголовка
+    if len(title) > 70:
+        title = title[:70] + "..."
+    
+    return title
 
 
 def generate_block_titles(blocks, method="enhanced_keywords"):
@@ -168,93 +396,9 @@ def generate_block_titles(blocks, method="enhanced_keywords"):
     if method == "enhanced_keywords":
         # Улучшенный метод на основе ключевых слов и первых предложений
         try:
-            import nltk
-            from nltk.corpus import stopwords
-            from nltk.tokenize import word_tokenize, sent_tokenize
-            from collections import Counter
-            
-            # Загрузка необходимых ресурсов NLTK
-            try:
-                nltk.data.find('tokenizers/punkt')
-            except LookupError:
-                nltk.download('punkt', quiet=True)
-            
-            try:
-                nltk.data.find('corpora/stopwords')
-            except LookupError:
-                nltk.download('stopwords', quiet=True)
-            
-            # Получаем стоп-слова для соответствующих языков
-            try:
-                stop_words_en = set(stopwords.words('english'))
-            except:
-                stop_words_en = set()
-            
-            try:
-                stop_words_ru = set(stopwords.words('russian'))
-            except:
-                stop_words_ru = set()
-            
-            # Объединяем стоп-слова разных языков
-            stop_words = stop_words_en.union(stop_words_ru)
-            
-            # Добавляем дополнительные общие стоп-слова
-            additional_stop_words = {'yeah', 'uh', 'um', 'oh', 'like', 'just', 'so', 'know', 'think', 'well', 'going', 
-                                    'get', 'got', 'actually', 'okay', 'right', 'thing', 'things', 'gonna', 'wanna'}
-            stop_words = stop_words.union(additional_stop_words)
-            
             for i, block in enumerate(blocks):
-                text = block["content_text"].lower()
-                
-                # Получаем первое предложение
-                sentences = sent_tokenize(text)
-                first_sentence = sentences[0] if sentences else ""
-                
-                # Очищаем первое предложение (берем не более 7 слов)
-                clean_first_words = []
-                for word in first_sentence.split()[:7]:
-                    # Очищаем от пунктуации
-                    clean_word = ''.join(c for c in word if c.isalnum())
-                    if clean_word and len(clean_word) > 1:
-                        clean_first_words.append(clean_word)
-                
-                first_phrase = " ".join(clean_first_words)
-                
-                # Находим ключевые слова из всего блока
-                words = word_tokenize(text)
-                words = [word.lower() for word in words 
-                         if word.isalnum() and word.lower() not in stop_words and len(word) > 2]
-                
-                word_counts = Counter(words)
-                top_words = [word for word, count in word_counts.most_common(4) if count > 1]
-                
-                # Формируем заголовок
-                if top_words and first_phrase:
-                    # Используем первую фразу и топ-ключевые слова
-                    if len(first_phrase) > 30:
-                        first_phrase = first_phrase[:30] + "..."
-                    
-                    key_words = ", ".join(top_words[:3]) if top_words else ""
-                    
-                    # Объединяем части в заголовок
-                    title = first_phrase.capitalize()
-                    if key_words:
-                        title += f" [{key_words}]"
-                elif first_phrase:
-                    # Используем только первую фразу
-                    title = first_phrase.capitalize()
-                elif top_words:
-                    # Используем только ключевые слова
-                    title = "Topic: " + ", ".join(top_words[:4])
-                else:
-                    # Если не удалось извлечь полезную информацию
-                    title = f"Section {i+1}"
-                
-                # Ограничиваем длину заголовка
-                if len(title) > 70:
-                    title = title[:70] + "..."
-                
-                block["title"] = title
+                # Если не удалось извлечь полезную информацию, нумеруем раздел
+                block["title"] = _enhanced_title(block["content_text"]) or f"Section {i+1}"
                 
         except Exception as e:
             logger.warning(f"Error generating enhanced keyword titles: {e}")
@@ -277,24 +421,8 @@ def generate_block_titles(blocks, method="enhanced_keywords"):
                 temperature=0.3
             )
             
-            for block in tqdm(blocks, desc="Generating titles with OpenAI"):
-                content = block["content_text"]
-                
-                # Ограничиваем длину текста для API
-                if len(content) > 2000:
-                    content = content[:2000] + "..."
-                
-                try:
-                    response = model.invoke(
-                        f"Generate a concise, informative title (5-10 words) for this text segment from a video: '{content}'"
-                    )
-                    title = response.content.strip().strip('"\'')
-                    block["title"] = title
-                except Exception as e:
-                    logger.warning(f"Error generating title with OpenAI: {e}")
-                    # Fallback to simpler method
-                    first_words = " ".join(content.split()[:7])
-                    block["title"] = first_words + "..."
+            # Запросы выполняются параллельно, а не по одному на блок
+            _run_async(_generate_openai_titles(model, blocks))
         except Exception as e:
             logger.error(f"Failed to use OpenAI for title generation: {e}")
             # Fallback to keywords method
@@ -303,21 +431,12 @@ def generate_block_titles(blocks, method="enhanced_keywords"):
     elif method == "first_sentence":
         # Простой метод на основе первого предложения
         try:
-            import nltk
-            from nltk.tokenize import sent_tokenize
-            
-            # Загрузка необходимых ресурсов NLTK
-            try:
-                nltk.data.find('tokenizers/punkt')
-            except LookupError:
-                nltk.download('punkt', quiet=True)
-            
             for i, block in enumerate(blocks):
                 text = block["content_text"]
                 
                 # Получаем первое предложение
-                sentences = sent_tokenize(text)
-                if sentences:
+                sentences = _SENTENCE_END_RE.split(text.strip(), maxsplit=1)
+                if sentences and sentences[0]:
                     first_sent = sentences[0]
                     # Ограничиваем длину
                     if len(first_sent) > 60:
@@ -361,43 +480,44 @@ def generate_table_of_contents(blocks):
     Генерирует оглавление на основе блоков субтитров с улучшенным форматированием
     
     Args:
-        blocks: Список блоков субтитров
+        blocks: Таблица блоков (BlockTable) или список блоков субтитров
         
     Returns:
         Строка в формате Markdown с оглавлением
     """
-    toc = "# Оглавление видео\n\n"
+    # Работаем с колонками таблицы блоков, а не со словарями
+    table = blocks if isinstance(blocks, BlockTable) else BlockTable.from_blocks(blocks)
     
-    # Проверяем, есть ли блоки с флагом YouTube глав
-    has_youtube_chapters = any(block.get("is_youtube_chapter", False) for block in blocks)
+    parts = ["# Оглавление видео\n\n"]
     
-    if has_youtube_chapters:
-        toc += "> ℹ️ Оглавление создано на основе глав YouTube\n\n"
+    # Проверяем, есть ли блоки с флагом YouTube глав
+    if any(table.is_chapter):
+        parts.append("> ℹ️ Оглавление создано на основе глав YouTube\n\n")
     
-    for i, block in enumerate(blocks):
+    rows = zip(table.start_times, table.end_times, table.titles, table.is_chapter)
+    for i, (block_start, block_end, title, is_chapter) in enumerate(rows):
         # Форматируем временные метки
-        start_time = format_time(block["start_time"])
-        duration = format_time(block["end_time"] - block["start_time"])
-        
-        # Полный заголовок без сокращений
-        title = block['title']
+        start_time = format_time(block_start)
+        duration = format_time(block_end - block_start)
         
         # Добавляем значок для глав YouTube
-        chapter_icon = "🔖 " if block.get("is_youtube_chapter", False) else ""
+        chapter_icon = "🔖 " if is_chapter else ""
         
         # Форматируем пункт оглавления с переносом строки для улучшения читаемости
-        toc += f"### {i+1}. {chapter_icon}{title}\n"
-        toc += f"**Время:** {start_time} | **Длительность:** {duration}\n\n"
+        parts.append(f"### {i+1}. {chapter_icon}{title}\n")
+        parts.append(f"**Время:** {start_time} | **Длительность:** {duration}\n\n")
     
-    return toc
+    return "".join(parts)
 
 # Функция для поиска доступных источников глав
-def check_chapter_sources(video_id):
+def check_chapter_sources(video_id, mode="any"):
     """
     Проверяет доступные источники глав для видео
     
     Args:
         video_id: ID видео YouTube
+        mode: "any" — остановиться на первом источнике с главами,
+              "all" — опросить все источники параллельно
         
     Returns:
         dict: Словарь с информацией о доступных источниках глав
@@ -407,25 +527,39 @@ def check_chapter_sources(video_id):
         "sources": []
     }
     
-    # Проверяем наличие глав через парсинг
-    try:
-        chapters = get_youtube_chapters(video_id)
+    # Источники глав в порядке приоритета: (название, функция, ключ счетчика)
+    sources = [
+        ("youtube_html", get_youtube_chapters, "chapters_count"),
+        ("youtube_api", get_youtube_video_chapters_api, "api_chapters_count")
+    ]
+    
+    def add_source(source, count_key, chapters):
         if chapters:
             result["has_chapters"] = True
-            result["sources"].append("youtube_html")
-            result["chapters_count"] = len(chapters)
-    except Exception as e:
-        logger.warning(f"Error checking HTML chapters: {e}")
+            result["sources"].append(source)
+            result[count_key] = len(chapters)
+    
+    if mode == "all":
+        # Запрашиваем все источники одновременно
+        with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+            futures = [(source, count_key, executor.submit(fetch, video_id))
+                       for source, fetch, count_key in sources]
+            for source, count_key, future in futures:
+                try:
+                    add_source(source, count_key, future.result())
+                except Exception as e:
+                    logger.warning(f"Error checking {source} chapters: {e}")
+        return result
     
-    # Проверяем наличие глав через API
-    try:
-        api_chapters = get_youtube_video_chapters_api(video_id)
-        if api_chapters:
-            result["has_chapters"] = True
-            result["sources"].append("youtube_api")
-            result["api_chapters_count"] = len(api_chapters)
-    except Exception as e:
-        logger.warning(f"Error checking API chapters: {e}")
+    # Проверяем источники по очереди до первого с главами
+    for source, fetch, count_key in sources:
+        try:
+            add_source(source, count_key, fetch(video_id))
+        except Exception as e:
+            logger.warning(f"Error checking {source} chapters: {e}")
+        
+        if result["has_chapters"]:
+            break
     
     return result
 
@@ -440,7 +574,7 @@ def display_toc_entry(block_index):
     Returns:
         Строка в формате Markdown с детальной информацией о блоке
     """
-    if not hasattr(app_state, 'subtitle_blocks') or not app_state.subtitle_blocks:
+    if not app_state.subtitle_blocks:
         return "Блоки субтитров не найдены. Сначала обработайте видео."
     
     try:
@@ -455,32 +589,35 @@ def display_toc_entry(block_index):
         block = app_state.subtitle_blocks[block_index]
         
         # Создаем подробное описание блока
-        content = f"## {block.get('title', f'Блок {block_index+1}')}\n\n"
+        parts = [f"## {block.get('title', f'Блок {block_index+1}')}\n\n"]
         
         # Добавляем временные метки
         if "start_time" in block and "end_time" in block:
-            start_time = format_time(block['start_time'])
-            end_time = format_time(block['end_time'])
-            duration = format_time(block['end_time'] - block['start_time'])
+            block_start = block['start_time']
+            block_end = block['end_time']
+            start_time = format_time(block_start)
+            end_time = format_time(block_end)
+            duration = format_time(block_end - block_start)
             
-            content += f"**Начало:** {start_time} | **Конец:** {end_time} | **Длительность:** {duration}\n\n"
+            parts.append(f"**Начало:** {start_time} | **Конец:** {end_time} | **Длительность:** {duration}\n\n")
         
         # Добавляем краткий обзор содержимого
         # Берем первые 100-200 символов текста для предпросмотра
-        if "content_text" in block and block["content_text"]:
-            preview_text = block["content_text"]
+        preview_text = block.get("content_text")
+        if preview_text:
             if len(preview_text) > 200:
                 preview_text = preview_text[:200] + "..."
             
-            content += f"**Обзор содержимого:**\n\n{preview_text}\n\n"
+            parts.append(f"**Обзор содержимого:**\n\n{preview_text}\n\n")
         
         # Добавляем количество субтитров в блоке
-        if "subtitles" in block and block["subtitles"]:
-            content += f"**Количество субтитров в блоке:** {len(block['subtitles'])}\n\n"
+        subtitles = block.get("subtitles")
+        if subtitles:
+            parts.append(f"**Количество субтитров в блоке:** {len(subtitles)}\n\n")
         
-        content += "Нажмите кнопку 'Показать содержимое блока' для просмотра полного текста."
+        parts.append("Нажмите кнопку 'Показать содержимое блока' для просмотра полного текста.")
         
-        return content
+        return "".join(parts)
     except Exception as e:
         logger.error(f"Error displaying TOC entry: {e}")
         return f"Ошибка при отображении информации о блоке: {str(e)}"
@@ -500,12 +637,13 @@ def process_subtitles_with_blocks(subtitles, video_info):
     """
     video_id = video_info.get("video_id") if video_info else None
     
+    # Заголовки генерируются ниже один раз для всех блоков без заголовков
     if video_id:
         # Попытка разбить субтитры с учетом существующих глав
-        blocks = analyze_subtitles_into_blocks_with_chapters(subtitles, video_id, video_info)
+        blocks = analyze_subtitles_into_blocks_with_chapters(subtitles, video_id, video_info, generate_titles=False)
     else:
         # Стандартное разбиение на блоки
-        blocks = analyze_subtitles_into_blocks(subtitles)
+        blocks = analyze_subtitles_into_blocks(subtitles, generate_titles=False)
     
     # Если заголовки не были заданы из YouTube глав, генерируем их
     for block in blocks:
@@ -516,34 +654,29 @@ def process_subtitles_with_blocks(subtitles, video_info):
     # Блоки, которым нужны заголовки
     blocks_to_title = [b for b in blocks if not b["title"]]
     if blocks_to_title:
-        titled_blocks = generate_block_titles(blocks_to_title, method="enhanced_keywords")
-        
-        # Заменяем блоки без заголовков на блоки с заголовками
-        for i, block in enumerate(blocks):
-            if not block["title"]:
-                # Ищем соответствующий блок с заголовком
-                for titled_block in titled_blocks:
-                    if titled_block["start_time"] == block["start_time"] and titled_block["end_time"] == block["end_time"]:
-                        block["title"] = titled_block["title"]
-                        break
+        # generate_block_titles заполняет заголовки на месте, поэтому
+        # блоки в общем списке получают их без повторного поиска
+        generate_block_titles(blocks_to_title, method="enhanced_keywords")
     
-    # Генерируем оглавление
-    toc = generate_table_of_contents(blocks)
+    # Сохраняем блоки в состоянии приложения в виде таблицы колонок
+    app_state.subtitle_blocks = BlockTable.from_blocks(blocks)
     
-    # Сохраняем блоки и оглавление в состоянии приложения
-    app_state.subtitle_blocks = blocks
+    # Генерируем оглавление
+    toc = generate_table_of_contents(app_state.subtitle_blocks)
     app_state.table_of_contents = toc
     
     # Сохраняем информацию о блоках в метаданных видео
     if video_id:
         try:
-            # Сохраняем только основную информацию о блоках (без полных субтитров)
+            # Сохраняем только основную информацию о блоках (без полных субтитров);
+            # текст блока сохраняется целиком, чтобы не собирать его заново при загрузке
             blocks_metadata = []
             for block in blocks:
                 blocks_metadata.append({
                     "start_time": block["start_time"],
                     "end_time": block["end_time"],
                     "title": block["title"],
+                    "content_text": block["content_text"],
                     "is_youtube_chapter": block.get("is_youtube_chapter", False)
                 })
             
@@ -569,7 +702,7 @@ def get_block_content(block_index):
     Returns:
         Строка в формате Markdown с содержимым блока
     """
-    if not hasattr(app_state, 'subtitle_blocks') or not app_state.subtitle_blocks:
+    if not app_state.subtitle_blocks:
         return "Блоки субтитров не найдены. Сначала обработайте видео."
     
     try:
@@ -584,26 +717,27 @@ def get_block_content(block_index):
         block = app_state.subtitle_blocks[block_index]
         
         # Форматируем содержимое блока
-        content = f"## {block.get('title', f'Блок {block_index+1}')}\n\n"
+        parts = [f"## {block.get('title', f'Блок {block_index+1}')}\n\n"]
         
         # Проверяем наличие временных меток
         if "start_time" in block and "end_time" in block:
-            content += f"**Временная метка:** {format_time(block['start_time'])} - {format_time(block['end_time'])}\n\n"
+            parts.append(f"**Временная метка:** {format_time(block['start_time'])} - {format_time(block['end_time'])}\n\n")
         
-        content += "### Содержание:\n\n"
+        parts.append("### Содержание:\n\n")
         
         # Добавляем субтитры блока с временными метками
-        if "subtitles" in block and block["subtitles"]:
-            for subtitle in block["subtitles"]:
+        subtitles = block.get("subtitles")
+        if subtitles:
+            fmt = format_time
+            append = parts.append
+            for subtitle in subtitles:
                 if "start" in subtitle:
-                    timestamp = format_time(subtitle["start"])
-                    text = subtitle.get("text", "")
-                    content += f"**[{timestamp}]** {text}\n\n"
+                    append(f"**[{fmt(subtitle['start'])}]** {subtitle.get('text', '')}\n\n")
         else:
             # Если субтитры отсутствуют, показываем основной текст блока
-            content += block.get("content_text", "Содержимое недоступно.")
+            parts.append(block.get("content_text", "Содержимое недоступно."))
         
-        return content
+        return "".join(parts)
     except Exception as e:
         logger.error(f"Error getting block content: {e}")
         return f"Ошибка при получении содержимого блока: {str(e)}"
@@ -1,21 +1,46 @@
+import os
+import asyncio
 import logging
+import threading
 from typing import List
-from langchain_core.prompts import PromptTemplate
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.messages import HumanMessage, AIMessage
 from langchain_core.output_parsers import StrOutputParser
-from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
-from langchain_community.llms import HuggingFaceHub
-from langchain_openai import ChatOpenAI
-from langchain_groq import ChatGroq
-from src.config import logger, api_status
+from src.config import logger, api_status, APP_SETTINGS
 from src import app_state
+from src.chat_cache import query_cache, semantic_cache
+
+
+# Model clients are built once per process and shared by all QA chains
+_LLM_CACHE = {}
+_LLM_LOCK = threading.Lock()
+
+# Pooled HTTP clients shared by the OpenAI and Groq models, so warm
+# connections are reused instead of a TLS handshake per client
+_HTTP_CLIENTS = {}
+
+# Prompt templates
+# Static instructions go first as the system message so every request starts
+# with an identical prefix that providers can serve from their prompt cache
+_QA_SYSTEM_PROMPT = """You are an assistant that helps users understand YouTube video content based on its subtitles.
+Answer the question based on the context from the video subtitles provided by the user.
+
+Provide a concise and helpful answer. If the answer is not in the context, say so.
+Include relevant timestamps if available in the context."""
+
+_QA_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", _QA_SYSTEM_PROMPT),
+    MessagesPlaceholder("chat_history"),
+    ("human", "Context:\n{context}\n\nQuestion: {question}\n\nAnswer:")
+])
 
 
 def get_chat_model(model_name: str = "huggingface"):
     """Get chat model based on selection
     
+    Instances are cached by resolved model, so switching models in the UI
+    reuses the already configured client.
+    
     Args:
         model_name: Name of the chat model to use
         
@@ -25,28 +50,149 @@ def get_chat_model(model_name: str = "huggingface"):
     # Handle dict input from Gradio dropdown
     if isinstance(model_name, dict):
         model_name = model_name.get("value", "huggingface")
+    
+    # Fall back to HuggingFace when the selected provider is not configured
+    if model_name not in ("openai", "groq", "vllm") or not api_status[model_name]:
+        model_name = "huggingface"
+    
+    with _LLM_LOCK:
+        llm = _LLM_CACHE.get(model_name)
+        if llm is None:
+            llm = _create_chat_model(model_name)
+            _LLM_CACHE[model_name] = llm
+        return llm
+
+
+def _get_http_clients():
+    """Return the shared (sync, async) HTTPX clients, creating them on first use
+    
+    Called under _LLM_LOCK.
+    """
+    if not _HTTP_CLIENTS:
+        import httpx
+        
+        # HTTP/2 needs the optional h2 package
+        try:
+            import h2  # noqa: F401
+            http2 = True
+        except ImportError:
+            http2 = False
         
-    if model_name == "openai" and api_status["openai"]:
+        limits = httpx.Limits(max_keepalive_connections=32, keepalive_expiry=300)
+        _HTTP_CLIENTS["sync"] = httpx.Client(limits=limits, http2=http2)
+        _HTTP_CLIENTS["async"] = httpx.AsyncClient(limits=limits, http2=http2)
+    
+    return _HTTP_CLIENTS["sync"], _HTTP_CLIENTS["async"]
+
+
+def _create_chat_model(model_name: str):
+    """Create a new chat model client for a resolved model name"""
+    # All models stream tokens so the chat can render the answer incrementally
+    # Providers are imported on first use: only one of them is needed per session
+    if model_name == "openai":
         from langchain_openai import ChatOpenAI
+        http_client, http_async_client = _get_http_clients()
         return ChatOpenAI(
             model_name="gpt-3.5-turbo",
-            temperature=0.7
+            temperature=0.7,
+            streaming=True,
+            http_client=http_client,
+            http_async_client=http_async_client
         )
-    elif model_name == "groq" and api_status["groq"]:
+    elif model_name == "groq":
         from langchain_groq import ChatGroq
+        http_client, http_async_client = _get_http_clients()
         return ChatGroq(
             model_name="llama3-70b-8192",
-            temperature=0.7
+            temperature=0.7,
+            streaming=True,
+            http_client=http_client,
+            http_async_client=http_async_client
+        )
+    elif model_name == "vllm":
+        # A vLLM server speaks the OpenAI API; it batches concurrent requests
+        # continuously, so answers for several users share forward passes
+        from langchain_openai import ChatOpenAI
+        http_client, http_async_client = _get_http_clients()
+        return ChatOpenAI(
+            model_name=os.environ.get("VLLM_MODEL", "meta-llama/Meta-Llama-3-8B-Instruct"),
+            base_url=os.environ["VLLM_BASE_URL"],
+            api_key=os.environ.get("VLLM_API_KEY", "EMPTY"),
+            temperature=0.7,
+            streaming=True,
+            http_client=http_client,
+            http_async_client=http_async_client
         )
     else:
         # Default to HuggingFace with explicitly specified model
-        from langchain_community.llms import HuggingFaceHub
-        return HuggingFaceHub(
+        from langchain_huggingface import HuggingFaceEndpoint
+        return HuggingFaceEndpoint(
             repo_id="google/flan-t5-xl",
-            model_kwargs={"temperature": 0.7, "max_length": 512},
-            task="text2text-generation"  # Explicitly specify the task
+            temperature=0.7,
+            max_new_tokens=512,
+            task="text2text-generation",  # Explicitly specify the task
+            streaming=True
         )
 
+
+def _history_to_messages(history: List, window: int):
+    """Convert the last `window` Gradio chat history pairs into chat messages for the QA prompt"""
+    messages = []
+    for question, answer in history[-window:] if window > 0 else ():
+        messages.append(HumanMessage(content=question))
+        messages.append(AIMessage(content=answer))
+    return messages
+
+
+def _format_docs(docs) -> str:
+    """Join retrieved documents into the QA prompt context
+    
+    Documents are ordered by their position in the video rather than by
+    retrieval rank, so the same chunks always render to the same text and
+    servers with prefix caching (vLLM) can reuse it.
+    """
+    ordered = sorted(docs, key=lambda doc: doc.metadata.get("chunk_id", 0))
+    return "\n\n".join(doc.page_content for doc in ordered)
+
+
+class QAChain:
+    """Streaming retrieval QA over the video subtitles
+
+    Each turn makes a single LLM call: the raw question is used for
+    retrieval and the conversation is passed straight into the QA prompt,
+    instead of first asking the model to rephrase the question.
+    Retrieval is a separate step so the caller gets the source documents
+    before the answer starts streaming. Only the last `history_window` turns
+    go into the prompt, so its size does not grow with the conversation.
+    """
+    def __init__(self, llm, retriever, qa_prompt, history_window: int = APP_SETTINGS["chat_history_window"]):
+        self.retriever = retriever
+        self.history_window = history_window
+        self.answer_chain = qa_prompt | llm | StrOutputParser()
+
+    async def aretrieve(self, question: str, question_vector=None):
+        """Return the documents relevant to the question
+        
+        When the question embedding is already known, the search runs on it
+        directly instead of embedding the question again.
+        """
+        if question_vector is not None and self.retriever.search_type == "mmr":
+            return await asyncio.to_thread(
+                self.retriever.vectorstore.max_marginal_relevance_search_by_vector,
+                question_vector,
+                **self.retriever.search_kwargs
+            )
+        return await self.retriever.ainvoke(question)
+
+    def astream(self, question: str, docs, history: List):
+        """Asynchronously yield answer chunks as the model produces them"""
+        return self.answer_chain.astream({
+            "context": _format_docs(docs),
+            "chat_history": _history_to_messages(history, self.history_window),
+            "question": question
+        })
+
+
 def setup_qa_chain(vectordb, model_name: str = "huggingface"):
     """Setup question answering chain
     
@@ -55,133 +201,148 @@ def setup_qa_chain(vectordb, model_name: str = "huggingface"):
         model_name: Name of the chat model to use
         
     Returns:
-        ConversationalRetrievalChain instance
+        QAChain instance
     """
     # Получаем модель
     llm = get_chat_model(model_name)
     
-    # Создаем память для истории разговора
-    memory = ConversationBufferMemory(
-        memory_key="chat_history",
-        output_key="answer",  # Явно указываем ключ вывода для сохранения в память
-        return_messages=True
-    )
-    
-    # Шаблоны подсказок
-    condense_question_prompt = PromptTemplate.from_template(
-        """Given the following conversation and a follow up question, rephrase the follow up question 
-        to be a standalone question that captures all relevant context from the conversation.
-        
-        Chat History:
-        {chat_history}
-        
-        Follow Up Input: {question}
-        Standalone question:"""
-    )
-    
-    qa_prompt = PromptTemplate.from_template(
-        """You are an assistant that helps users understand YouTube video content based on its subtitles.
-        Answer the question based on the following context from the video subtitles.
-        
-        Context:
-        {context}
-        
-        Question: {question}
-        
-        Provide a concise and helpful answer. If the answer is not in the context, say so.
-        Include relevant timestamps if available in the context.
-        
-        Answer:"""
+    # MMR picks 3 diverse chunks out of the 20 most similar ones, so the
+    # prompt does not spend tokens on near-duplicate context
+    retriever = vectordb.as_retriever(
+        search_type="mmr",
+        search_kwargs={"k": 3, "fetch_k": 20, "lambda_mult": 0.5}
     )
     
     # Создаем QA цепочку
     try:
-        qa_chain = ConversationalRetrievalChain.from_llm(
-            llm=llm,
-            retriever=vectordb.as_retriever(search_kwargs={"k": 3}),
-            return_source_documents=True,
-            memory=memory,
-            condense_question_prompt=condense_question_prompt,
-            combine_docs_chain_kwargs={"prompt": qa_prompt}
-        )
-        
-        return qa_chain
+        return QAChain(llm, retriever, _QA_PROMPT)
     except Exception as e:
         logger.error(f"Error setting up QA chain: {e}")
         # Если возникла ошибка, выводим информативное сообщение и пытаемся использовать более простую модель
         logger.info("Falling back to simpler model configuration")
         
         # Пробуем использовать более простую модель HuggingFace
-        from langchain_community.llms import HuggingFaceHub
-        simple_llm = HuggingFaceHub(
+        from langchain_huggingface import HuggingFaceEndpoint
+        simple_llm = HuggingFaceEndpoint(
             repo_id="google/flan-t5-base",  # Более простая и надежная модель
-            model_kwargs={"temperature": 0.5, "max_length": 256},
-            task="text2text-generation"
-        )
-        
-        # Создаем более простую версию QA цепочки
-        qa_chain = ConversationalRetrievalChain.from_llm(
-            llm=simple_llm,
-            retriever=vectordb.as_retriever(search_kwargs={"k": 3}),
-            return_source_documents=True,
-            memory=ConversationBufferMemory(
-                memory_key="chat_history",
-                output_key="answer",
-                return_messages=True
-            )
+            temperature=0.5,
+            max_new_tokens=256,
+            task="text2text-generation",
+            streaming=True
         )
         
-        return qa_chain
+        return QAChain(simple_llm, retriever, _QA_PROMPT)
+
+def _embed_question(question: str):
+    """Embed a question with the vector database's embedding model
+
+    Returns:
+        Embedding vector or None if it cannot be computed
+    """
+    try:
+        return app_state.vectordb.embeddings.embed_query(question)
+    except Exception as e:
+        logger.warning(f"Could not embed question for semantic cache: {e}")
+        return None
+
+
+def _append_timestamps(answer: str, timestamps: List[str]) -> str:
+    """Append the source timestamps to an answer"""
+    if timestamps:
+        return answer + f"\n\nRelevant timestamps: {', '.join(timestamps)}"
+    return answer
+
 
-def chat_with_subtitles(message: str, history: List, model_name: str = "huggingface"):
-    """Chat with the video content
+async def chat_with_subtitles(message: str, history: List, model_name: str = "huggingface"):
+    """Chat with the video content, streaming the answer
+    
+    Runs on the Gradio event loop: the model and the retriever are called
+    through their async APIs and other blocking work goes to worker threads,
+    so one slow answer does not hold up other users.
     
     Args:
         message: User message
         history: Chat history
         model_name: Name of the chat model
         
-    Returns:
-        Updated history with bot response
+    Yields:
+        Updated history with the partial bot response
     """
-    if not hasattr(app_state, 'qa_chain') or not app_state.qa_chain:
-        return history + [[message, "Please process a video first before chatting."]]
+    if not app_state.qa_chain:
+        yield history + [[message, "Please process a video first before chatting."]]
+        return
     
     if not message:
-        return history
+        yield history
+        return
     
     try:
         # Handle dict input from Gradio dropdown
         if isinstance(model_name, dict):
             model_name = model_name.get("value", "huggingface")
         
-        # Initialize current_model if it doesn't exist
-        if not hasattr(app_state, 'current_model'):
-            app_state.current_model = "huggingface"
+        # Answer repeated questions from the cache
+        # (cache operations are short and never await while holding the lock).
+        # The prompt includes recent turns, so answers to follow-ups depend on
+        # the conversation: only questions asked without history are cached,
+        # in either cache
+        use_cache = not history
+        cache_key = query_cache.make_key(app_state.video_info.get("video_id"), message, model_name)
+        cached = query_cache.get(cache_key) if use_cache else None
+        
+        # Fall back to near-duplicate questions by embedding similarity
+        semantic_scope = cache_key[0], model_name
+        question_vector = None
+        if cached is None:
+            question_vector = await asyncio.to_thread(_embed_question, message)
+            if question_vector is not None and use_cache:
+                cached = semantic_cache.get(semantic_scope, question_vector)
+        
+        if cached is not None:
+            answer, timestamps = cached
+            yield history + [[message, _append_timestamps(answer, timestamps)]]
+            return
+        
+        # Start retrieval right away: it only depends on the vector database,
+        # so it runs while the model is switched below if needed
+        retrieval = asyncio.ensure_future(app_state.qa_chain.aretrieve(message, question_vector))
         
         # Update model if needed
         if model_name != app_state.current_model:
-            app_state.qa_chain = setup_qa_chain(app_state.vectordb, model_name)
+            app_state.qa_chain = await asyncio.to_thread(setup_qa_chain, app_state.vectordb, model_name)
             app_state.current_model = model_name
         
-        # Get response
-        result = app_state.qa_chain({"question": message})
-        answer = result.get("answer", "")
+        # Wait for the context, then stream the answer as it is generated
+        source_docs = await retrieval
+        
+        # The history is copied once per turn; each chunk only updates the last pair
+        turns = history + [[message, ""]]
+        answer = ""
+        async for chunk in app_state.qa_chain.astream(message, source_docs, history):
+            answer += chunk
+            turns[-1][1] = answer
+            yield turns
         
         # Fetch source timestamps if available
-        source_docs = result.get("source_documents", [])
-        if source_docs:
-            timestamps = []
-            for doc in source_docs:
-                if "time_str" in doc.metadata:
-                    timestamps.append(doc.metadata["time_str"])
-            
-            if timestamps:
-                answer += f"\n\nRelevant timestamps: {', '.join(timestamps)}"
-        
-        # Update history
-        return history + [[message, answer]]
+        timestamps = [doc.metadata["time_str"] for doc in source_docs if "time_str" in doc.metadata]
+        
+        if use_cache:
+            query_cache.set(cache_key, (answer, timestamps))
+            if question_vector is not None:
+                semantic_cache.set(semantic_scope, question_vector, (answer, timestamps))
+        
+        turns[-1][1] = _append_timestamps(answer, timestamps)
+        yield turns
     
     except Exception as e:
         logger.error(f"Chat error: {e}")
-        return history + [[message, f"Error: {str(e)}"]]
+        yield history + [[message, f"Error: {str(e)}"]]
+
+
+def clear_chat_history():
+    """Clear the chat history
+    
+    Returns:
+        Empty history for the chatbot
+    """
+    return []
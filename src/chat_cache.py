@@ -0,0 +1,162 @@
+import re
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from src.config import logger
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a question for cache lookups (case and whitespace insensitive)
+
+    Args:
+        question: User question
+
+    Returns:
+        Normalized question
+    """
+    return _WHITESPACE_RE.sub(" ", question.strip().lower())
+
+
+class QueryCache:
+    """Thread-safe LRU cache with TTL for chat answers
+
+    Keys are (video_id, normalized question, model name); values are
+    (answer, timestamps) pairs.
+    """
+    def __init__(self, max_size: int = 2000, ttl_seconds: float = 600, log_every: int = 100):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.log_every = log_every
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def make_key(video_id, question: str, model_name: str):
+        """Build the cache key for a question"""
+        return (video_id, normalize_question(question), model_name)
+
+    def get(self, key):
+        """Return the cached value for a key or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] >= self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            self._log_stats()
+
+            return entry[1] if entry is not None else None
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entries if needed"""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all cached answers (e.g. after the vector database changes)"""
+        with self._lock:
+            self._entries.clear()
+
+    def _log_stats(self):
+        lookups = self.hits + self.misses
+        if self.log_every and lookups % self.log_every == 0:
+            logger.info(f"Chat cache: {self.hits} hits, {self.misses} misses, {len(self._entries)} entries")
+
+
+class SemanticQueryCache:
+    """Cache of chat answers matched by question embedding similarity
+
+    Catches near-duplicate questions that the exact-match cache misses.
+    Question vectors are kept L2-normalized in one matrix, so a lookup is
+    a single matrix-vector product.
+    """
+    def __init__(self, threshold: float = 0.95, max_size: int = 1000, ttl_seconds: float = 600):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._vectors = None
+        self._entries = []  # (scope, created_at, value) per row of _vectors
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, scope, vector):
+        """Return the value of the most similar cached question above the threshold
+
+        Args:
+            scope: Entries only match within the same scope, e.g. (video_id, model)
+            vector: Question embedding
+
+        Returns:
+            Cached value or None
+        """
+        with self._lock:
+            if self._vectors is None:
+                return None
+
+            query = self._normalize(vector)
+            if query.shape[0] != self._vectors.shape[1]:
+                return None
+
+            similarities = self._vectors @ query
+            now = time.monotonic()
+            for i, (entry_scope, created_at, _) in enumerate(self._entries):
+                if entry_scope != scope or now - created_at >= self.ttl_seconds:
+                    similarities[i] = -np.inf
+
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                return self._entries[best][2]
+            return None
+
+    def set(self, scope, vector, value):
+        """Store a value for a question embedding, evicting the oldest rows if needed"""
+        with self._lock:
+            row = self._normalize(vector)[np.newaxis, :]
+            if self._vectors is None or self._vectors.shape[1] != row.shape[1]:
+                # First entry or the embedding model changed
+                self._vectors = row
+                self._entries = []
+            else:
+                self._vectors = np.vstack([self._vectors, row])
+            self._entries.append((scope, time.monotonic(), value))
+
+            overflow = len(self._entries) - self.max_size
+            if overflow > 0:
+                self._vectors = self._vectors[overflow:]
+                self._entries = self._entries[overflow:]
+
+    def clear(self):
+        """Drop all cached answers"""
+        with self._lock:
+            self._vectors = None
+            self._entries = []
+
+
+# Shared caches of chat answers
+query_cache = QueryCache()
+semantic_cache = SemanticQueryCache()
+
+
+def clear_chat_caches():
+    """Drop all cached chat answers (call when the vector database changes)"""
+    query_cache.clear()
+    semantic_cache.clear()
@@ -15,23 +15,20 @@ BASE_PATH = PROJECT_ROOT
 ENV_PATH = os.path.join(BASE_PATH, '.env')
 DB_PATH = os.path.join(BASE_PATH, 'chroma_db')
 LOGS_PATH = os.path.join(BASE_PATH, 'logs')
+# int8 ONNX экспорт модели эмбеддингов (создается python -m src.onnx_embeddings)
+ONNX_MODEL_PATH = os.path.join(BASE_PATH, 'onnx_minilm')
 
-# Создаем директории, если они не существуют
-os.makedirs(BASE_PATH, exist_ok=True)
-os.makedirs(DB_PATH, exist_ok=True)
-os.makedirs(LOGS_PATH, exist_ok=True)
+logger = logging.getLogger("studypal")
 
-# Настройка логирования
-log_file = os.path.join(LOGS_PATH, f'app_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log')
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_file),
-        logging.StreamHandler()
-    ]
+# API токены: (ключ статуса, переменная окружения, значение-заглушка из шаблона .env)
+_API_TOKENS = (
+    ("huggingface", "HUGGINGFACEHUB_API_TOKEN", "your_huggingface_token_here"),
+    ("openai", "OPENAI_API_KEY", "your_openai_key_here"),
+    ("groq", "GROQ_API_KEY", "your_groq_key_here"),
+    ("youtube", "YOUTUBE_DATA_API_KEY", "your_youtube_api_key_here"),
+    # Адрес OpenAI-совместимого сервера vLLM, например http://localhost:8000/v1
+    ("vllm", "VLLM_BASE_URL", "your_vllm_server_url_here"),
 )
-logger = logging.getLogger("studypal")
 
 # Функция для безопасного получения и установки API токенов
 def setup_api_tokens():
@@ -40,41 +37,18 @@ def setup_api_tokens():
     if not os.path.exists(ENV_PATH):
         logger.info(f"Creating template .env file at {ENV_PATH}")
         with open(ENV_PATH, 'w') as f:
-            f.write("""# API Keys
-HUGGINGFACEHUB_API_TOKEN=your_huggingface_token_here
-OPENAI_API_KEY=your_openai_key_here
-GROQ_API_KEY=your_groq_key_here
-YOUTUBE_DATA_API_KEY=your_youtube_api_key_here
-""")
+            f.write("# API Keys\n")
+            f.writelines(f"{var}={placeholder}\n" for _, var, placeholder in _API_TOKENS)
     
-    # Загружаем переменные окружения
+    # Загружаем переменные окружения (load_dotenv помещает их в os.environ)
     load_dotenv(ENV_PATH)
     
-    api_status = {"huggingface": False, "openai": False, "groq": False, "youtube": False}
-    
-    # HuggingFace Token
-    huggingface_token = os.getenv('HUGGINGFACEHUB_API_TOKEN')
-    if huggingface_token and huggingface_token != "your_huggingface_token_here":
-        os.environ['HUGGINGFACEHUB_API_TOKEN'] = huggingface_token
-        api_status["huggingface"] = True
-    
-    # OpenAI Token
-    openai_api_key = os.getenv('OPENAI_API_KEY')
-    if openai_api_key and openai_api_key != "your_openai_key_here":
-        os.environ['OPENAI_API_KEY'] = openai_api_key
-        api_status["openai"] = True
-    
-    # Groq Token
-    groq_api_key = os.getenv('GROQ_API_KEY')
-    if groq_api_key and groq_api_key != "your_groq_key_here":
-        os.environ['GROQ_API_KEY'] = groq_api_key
-        api_status["groq"] = True
-    
-    # YouTube Data API Token
-    youtube_api_key = os.getenv('YOUTUBE_DATA_API_KEY')
-    if youtube_api_key and youtube_api_key != "your_youtube_api_key_here":
-        os.environ['YOUTUBE_DATA_API_KEY'] = youtube_api_key
-        api_status["youtube"] = True
+    # Токен считается настроенным, если он задан и не равен заглушке
+    env = os.environ
+    api_status = {}
+    for key, var, placeholder in _API_TOKENS:
+        value = env.get(var)
+        api_status[key] = bool(value) and value != placeholder
     
     return api_status
 
@@ -88,47 +62,85 @@ APP_SETTINGS = {
     "use_youtube_chapters": True, # Use YouTube chapters by default
     "default_language": "en",     # Default subtitle language
     "default_embedding": "huggingface", # Default embedding model
-    "default_chat_model": "huggingface" # Default chat model
+    "default_chat_model": "huggingface", # Default chat model
+    "title_generation_concurrency": 8, # Max concurrent LLM requests for block titles
+    "chat_history_window": 4,     # Number of recent chat turns passed to the QA prompt
+    "queue_concurrency": 8        # Number of Gradio queue workers (concurrent handlers)
 }
 
+# Варианты выпадающих списков (кортежи, чтобы их нельзя было случайно изменить)
 # Доступные языки для субтитров
-AVAILABLE_LANGUAGES = [
+AVAILABLE_LANGUAGES = (
     {"value": "en", "text": "English"},
     {"value": "ru", "text": "Russian"},
     {"value": "es", "text": "Spanish"},
     {"value": "fr", "text": "French"},
     {"value": "de", "text": "German"}
-]
+)
 
 # Доступные модели
-CHAT_MODELS = [
+CHAT_MODELS = (
     {"value": "huggingface", "text": "HuggingFace Model"},
     {"value": "openai", "text": "OpenAI Model"},
-    {"value": "groq", "text": "Groq Model"}
-]
+    {"value": "groq", "text": "Groq Model"},
+    {"value": "vllm", "text": "vLLM Server"}
+)
 
-EMBEDDING_MODELS = [
+EMBEDDING_MODELS = (
     {"value": "huggingface", "text": "HuggingFace Embeddings"},
     {"value": "openai", "text": "OpenAI Embeddings"}
-]
+)
 
 # Языки для перевода
-TRANSLATION_LANGUAGES = [
-    {"value": "en", "text": "English"},
-    {"value": "ru", "text": "Russian"},
-    {"value": "es", "text": "Spanish"},
-    {"value": "fr", "text": "French"},
-    {"value": "de", "text": "German"},
+TRANSLATION_LANGUAGES = AVAILABLE_LANGUAGES + (
     {"value": "zh", "text": "Chinese"},
     {"value": "ja", "text": "Japanese"},
     {"value": "it", "text": "Italian"}
-]
+)
+
+# Статус API токенов (заполняется в configure())
+api_status = {"huggingface": False, "openai": False, "groq": False, "youtube": False, "vllm": False}
 
-# Инициализация API токенов
-api_status = setup_api_tokens()
+_configured = False
 
-# Вывод информации о путях в лог при запуске
-logger.info(f"Base path: {BASE_PATH}")
-logger.info(f"Database path: {DB_PATH}")
-logger.info(f"Logs path: {LOGS_PATH}")
-logger.info(f"API status: {api_status}")
\ No newline at end of file
+
+def configure():
+    """Create app directories, set up logging and load API tokens
+    
+    Called once from the application entry point, so importing the module
+    for its constants does not touch the disk. Repeated calls do nothing.
+    
+    Returns:
+        dict: API status
+    """
+    global _configured
+    if _configured:
+        return api_status
+    
+    # Создаем директории, если они не существуют
+    os.makedirs(BASE_PATH, exist_ok=True)
+    os.makedirs(DB_PATH, exist_ok=True)
+    os.makedirs(LOGS_PATH, exist_ok=True)
+    
+    # Настройка логирования
+    log_file = os.path.join(LOGS_PATH, f'app_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log')
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_file),
+            logging.StreamHandler()
+        ]
+    )
+    
+    # Инициализация API токенов (обновляем словарь на месте: его уже импортировали другие модули)
+    api_status.update(setup_api_tokens())
+    
+    # Вывод информации о путях в лог при запуске
+    logger.info(f"Base path: {BASE_PATH}")
+    logger.info(f"Database path: {DB_PATH}")
+    logger.info(f"Logs path: {LOGS_PATH}")
+    logger.info(f"API status: {api_status}")
+    
+    _configured = True
+    return api_status
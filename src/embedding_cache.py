@@ -0,0 +1,264 @@
+import os
+import re
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import List
+from langchain_core.embeddings import Embeddings
+from src.config import logger, DB_PATH
+
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# SimHash settings: 64-bit fingerprints split into 4 bands of 16 bits. Two
+# fingerprints within SIMHASH_MAX_DISTANCE bits of each other share at least
+# one whole band, so candidates are found with exact band lookups.
+SIMHASH_BANDS = 4
+SIMHASH_MAX_DISTANCE = 3
+SIMHASH_MIN_TOKENS = 20
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text before SimHash fingerprinting (case, punctuation and whitespace insensitive)"""
+    return _WHITESPACE_RE.sub(" ", _PUNCTUATION_RE.sub(" ", text.lower())).strip()
+
+
+def simhash(text: str):
+    """Return the 64-bit SimHash of normalized text over word 3-grams
+
+    Returns:
+        Fingerprint or None when the text is too short for a reliable one
+    """
+    tokens = text.split()
+    if len(tokens) < SIMHASH_MIN_TOKENS:
+        return None
+
+    weights = np.zeros(64, dtype=np.int64)
+    bits = np.arange(64, dtype=np.uint64)
+    for i in range(len(tokens) - 2):
+        shingle = " ".join(tokens[i:i + 3]).encode("utf-8")
+        value = np.uint64(int.from_bytes(hashlib.blake2b(shingle, digest_size=8).digest(), "little"))
+        weights += np.where((value >> bits) & np.uint64(1), 1, -1)
+
+    return sum(1 << i for i in np.flatnonzero(weights > 0).tolist())
+
+
+def _bands(fingerprint: int):
+    band_bits = 64 // SIMHASH_BANDS
+    mask = (1 << band_bits) - 1
+    return [(fingerprint >> (i * band_bits)) & mask for i in range(SIMHASH_BANDS)]
+
+
+class EmbeddingStore:
+    """SQLite-backed persistent store of embedding vectors keyed by content hash"""
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(DB_PATH, "_embedding_cache.sqlite3")
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Called under the lock; the database is opened on first use
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            # SimHash fingerprints of embedded documents for near-duplicate lookups
+            # are scoped to the embedding model namespace: vectors of different
+            # models are not interchangeable
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(simhashes)")]
+            if columns and "namespace" not in columns:
+                # Fingerprints from before namespacing cannot be attributed to a model
+                self._conn.execute("DROP TABLE simhashes")
+            band_columns = ", ".join(f"band{i} INTEGER NOT NULL" for i in range(SIMHASH_BANDS))
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS simhashes "
+                f"(key TEXT PRIMARY KEY, namespace TEXT NOT NULL, fingerprint TEXT NOT NULL, {band_columns})"
+            )
+            for i in range(SIMHASH_BANDS):
+                self._conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS simhashes_ns_band{i} ON simhashes (namespace, band{i})"
+                )
+        return self._conn
+
+    def get_many(self, keys: List[str]) -> dict:
+        """Return {key: vector} for the keys present in the store"""
+        found = {}
+        with self._lock:
+            conn = self._connect()
+            # Stay well below SQLite's limit on query parameters
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, items) -> None:
+        """Store (key, vector) pairs"""
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+
+    def put_simhashes(self, namespace: str, items) -> None:
+        """Store (key, fingerprint) pairs of documents embedded under the namespace"""
+        # Fingerprints are unsigned 64-bit, beyond SQLite's signed INTEGER, so they are kept as text
+        rows = [(key, namespace, str(fingerprint), *_bands(fingerprint)) for key, fingerprint in items]
+        placeholders = ",".join("?" * (SIMHASH_BANDS + 3))
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(f"INSERT OR REPLACE INTO simhashes VALUES ({placeholders})", rows)
+
+    def find_near_duplicate(self, namespace: str, fingerprint: int):
+        """Return the vector of a document stored under the namespace whose fingerprint is within SIMHASH_MAX_DISTANCE bits
+
+        Returns:
+            Vector or None if there is no near duplicate
+        """
+        bands = " OR ".join(f"s.band{i} = ?" for i in range(SIMHASH_BANDS))
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(
+                "SELECT s.fingerprint, e.vector FROM simhashes s JOIN embeddings e ON e.key = s.key "
+                f"WHERE s.namespace = ? AND ({bands})",
+                [namespace, *_bands(fingerprint)]
+            )
+            for candidate, blob in rows:
+                if bin(int(candidate) ^ fingerprint).count("1") <= SIMHASH_MAX_DISTANCE:
+                    return np.frombuffer(blob, dtype=np.float32).tolist()
+        return None
+
+
+class CachedEmbeddings(Embeddings):
+    """Embedding model wrapper that reuses vectors of previously seen texts
+
+    Vectors are keyed by sha256 of the model namespace and the exact
+    text. Hot entries stay in an in-process LRU, everything else is
+    persisted in an EmbeddingStore, so processing the same video again or
+    asking the same question does not call the model. Documents that miss
+    this exact lookup can still reuse the vector of a near duplicate (e.g.
+    refreshed auto-captions) found by SimHash. Remaining misses are
+    embedded in one batch.
+    """
+    def __init__(self, embeddings: Embeddings, namespace: str, store: EmbeddingStore = None, memory_size: int = 2048):
+        self.embeddings = embeddings
+        self.namespace = namespace
+        self.store = store or embedding_store
+        self.memory_size = memory_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, kind: str, text: str) -> str:
+        return hashlib.sha256(f"{self.namespace}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key, vector):
+        # Called under the lock
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, keys: List[str]) -> dict:
+        """Return cached vectors for the keys, from memory first, then from disk"""
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+
+        missing = [key for key in keys if key not in found]
+        if missing:
+            try:
+                stored = self.store.get_many(missing)
+            except Exception as e:
+                logger.warning(f"Embedding cache read failed: {e}")
+                stored = {}
+            with self._lock:
+                for key, vector in stored.items():
+                    self._remember(key, vector)
+            found.update(stored)
+        return found
+
+    def _save(self, items) -> None:
+        with self._lock:
+            for key, vector in items:
+                self._remember(key, vector)
+        try:
+            self.store.put_many(items)
+        except Exception as e:
+            logger.warning(f"Embedding cache write failed: {e}")
+
+    def _reuse_near_duplicates(self, missing: dict, found: dict) -> dict:
+        """Fill `found` with vectors of near-duplicate documents
+
+        Returns:
+            Fingerprints of the documents that still need embedding
+        """
+        fingerprints = {}
+        for key, text in list(missing.items()):
+            fingerprint = simhash(normalize_text(text))
+            if fingerprint is None:
+                continue
+            try:
+                vector = self.store.find_near_duplicate(self.namespace, fingerprint)
+            except Exception as e:
+                logger.warning(f"Embedding cache near-duplicate lookup failed: {e}")
+                vector = None
+            if vector is not None:
+                del missing[key]
+                found[key] = vector
+                self._save([(key, vector)])
+            else:
+                fingerprints[key] = fingerprint
+        return fingerprints
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key("doc", text) for text in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        fingerprints = self._reuse_near_duplicates(missing, found) if missing else {}
+
+        # Embed each distinct remaining text once, in a single batch sorted by
+        # length so each model batch pads to similar lengths; vectors are
+        # mapped back by key, so the order does not matter to the caller
+        if missing:
+            batch_keys = sorted(missing, key=lambda key: len(missing[key]))
+            vectors = self.embeddings.embed_documents([missing[key] for key in batch_keys])
+            items = list(zip(batch_keys, vectors))
+            self._save(items)
+            found.update(items)
+            try:
+                self.store.put_simhashes(
+                    self.namespace,
+                    [(key, fingerprints[key]) for key in missing if key in fingerprints]
+                )
+            except Exception as e:
+                logger.warning(f"Embedding cache write failed: {e}")
+
+        logger.info(f"Embedding cache: {len(texts) - len(missing)} of {len(texts)} chunks reused")
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key("query", text)
+        vector = self._lookup([key]).get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self._save([(key, vector)])
+        return vector
+
+
+# Shared persistent store of embedding vectors
+embedding_store = EmbeddingStore()
@@ -1,18 +1,175 @@
 import gradio as gr
 import logging
 import os
+import bisect
+import asyncio
+import string
+from operator import itemgetter
 from typing import List, Dict, Any
-from src.config import logger, AVAILABLE_LANGUAGES, TRANSLATION_LANGUAGES, CHAT_MODELS, EMBEDDING_MODELS
-from src import app_state
+from src.config import logger, APP_SETTINGS, AVAILABLE_LANGUAGES, TRANSLATION_LANGUAGES, CHAT_MODELS, EMBEDDING_MODELS
+from src import app_state, BlockTable
 from src.utils import display_info, format_time
 from src.youtube import extract_video_id, get_youtube_subtitles
-from src.processing import get_embedding_model, create_vector_db, get_existing_vector_db, get_saved_databases, load_database_by_id, process_subtitles_to_documents
+from src.processing import get_embedding_model, create_vector_db, get_existing_vector_db, get_saved_databases, load_database_by_id, load_video_metadata, process_subtitles_to_documents, add_block_document_ranges, add_block_subtitle_ranges, save_video_metadata
 from src.blocks import process_subtitles_with_blocks, display_toc_entry, get_block_content, generate_table_of_contents
-from src.chat import setup_qa_chain, chat_with_subtitles
-from src.translation import translate_subtitle_text
+from src.chat import setup_qa_chain, chat_with_subtitles, clear_chat_history
+from src.chat_cache import clear_chat_caches
+from src.translation import translate_subtitle_texts
 from src.youtube import format_subtitles
 
 
+# HTML-шаблоны информации о видео (компилируются один раз при импорте)
+_VIDEO_INFO_TMPL = string.Template("""
+<div style="display: flex; align-items: center; margin-bottom: 20px;">
+    <img src="$thumbnail" style="width: 120px; margin-right: 15px;">
+    <div>
+        <h3>$title</h3>
+        <p>By: $author</p>
+        <p>Language: $language</p>
+        <p>Blocks: $blocks</p>
+    </div>
+</div>
+""")
+
+_DATABASE_INFO_TMPL = string.Template("""
+<div style="display: flex; align-items: center; margin-bottom: 20px;">
+    <div>
+        <h3>$title</h3>
+        <p>ID: $video_id</p>
+        <p>Язык: $language</p>
+        <p>Создано: $created_at</p>
+    </div>
+</div>
+""")
+
+
+def render_video_info_html(video_info, blocks_count):
+    """Render the video info panel for a processed video
+    
+    Args:
+        video_info: Dictionary with video information
+        blocks_count: Number of subtitle blocks
+        
+    Returns:
+        HTML string
+    """
+    get = video_info.get
+    return _VIDEO_INFO_TMPL.substitute(
+        thumbnail=get('thumbnail', ''),
+        title=get('title', 'Unknown title'),
+        author=get('author', 'Unknown'),
+        language=get('language', 'Unknown'),
+        blocks=blocks_count
+    )
+
+
+def restore_subtitles_from_db(vectordb):
+    """
+    Восстанавливает субтитры из фрагментов, сохраненных в векторной базе данных
+    
+    Args:
+        vectordb: Экземпляр векторной базы данных
+        
+    Returns:
+        Список субтитров, отсортированный по времени начала
+    """
+    try:
+        # Читаем все документы коллекции напрямую, без поиска по сходству
+        raw = vectordb.get(include=["metadatas", "documents"])
+        
+        # Создаем записи субтитров
+        subtitles = [
+            {
+                "start": metadata["timestamp"],
+                "duration": metadata.get("duration", 5),  # Примерная длительность
+                "text": text
+            }
+            for metadata, text in zip(raw["metadatas"], raw["documents"])
+            if metadata and metadata.get("timestamp") is not None
+        ]
+        
+        # Сортируем субтитры по времени начала
+        subtitles.sort(key=itemgetter("start"))
+        return subtitles
+    except Exception as e:
+        logger.warning(f"Не удалось восстановить субтитры: {e}")
+        return []
+
+
+def restore_blocks_from_metadata(video_info, subtitles):
+    """
+    Восстанавливает блоки субтитров из метаданных видео
+    
+    Args:
+        video_info: Метаданные видео
+        subtitles: Отсортированный по времени список субтитров
+        
+    Returns:
+        Список блоков или None, если в метаданных нет информации о блоках
+    """
+    if "blocks" not in video_info:
+        return None
+    
+    blocks = []
+    subtitle_starts = None
+    
+    # Восстанавливаем блоки из метаданных
+    for block_meta in video_info["blocks"]:
+        if "subtitle_start_idx" in block_meta:
+            # Диапазон сохранен при первой обработке видео
+            lo, hi = block_meta["subtitle_start_idx"], block_meta["subtitle_end_idx"]
+        else:
+            # Старые метаданные: находим субтитры блока бинарным поиском (субтитры отсортированы)
+            if subtitle_starts is None:
+                subtitle_starts = [s["start"] for s in subtitles]
+            lo = bisect.bisect_left(subtitle_starts, block_meta["start_time"])
+            hi = bisect.bisect_right(subtitle_starts, block_meta["end_time"], lo)
+        block_subtitles = subtitles[lo:hi]
+        
+        block = {
+            "start_time": block_meta["start_time"],
+            "end_time": block_meta["end_time"],
+            "title": block_meta["title"],
+            "is_youtube_chapter": block_meta.get("is_youtube_chapter", False),
+            "subtitles": block_subtitles,
+            "content_text": block_meta.get("content_text") or " ".join(s["text"] for s in block_subtitles)
+        }
+        
+        blocks.append(block)
+    
+    return blocks
+
+
+def build_block_choices(blocks):
+    """
+    Формирует варианты выпадающего списка блоков
+    
+    Args:
+        blocks: Таблица блоков (BlockTable)
+        
+    Returns:
+        Список вариантов {"value": индекс, "text": подпись}
+    """
+    choices = []
+    append = choices.append
+    ft = format_time
+    
+    # Читаем только нужные колонки таблицы, не собирая словари блоков
+    for i, (start_time, title, is_chapter) in enumerate(zip(blocks.start_times, blocks.titles, blocks.is_chapter)):
+        title = title or f"Раздел {i+1}"
+        
+        # Сокращаем заголовок для выпадающего списка, если он слишком длинный
+        if len(title) > 40:
+            title = title[:37] + "..."
+        
+        # Добавляем значок для глав YouTube
+        chapter_icon = "🔖 " if is_chapter else ""
+        
+        append({"value": str(i), "text": f"{ft(start_time)} - {chapter_icon}{title}"})
+    
+    return choices
+
+
 # Обновление функции process_video для поддержки разбиения на блоки
 def process_video(youtube_url: str, embedding_model: str = "huggingface", language: str = "en"):
     """Process YouTube video to extract and store subtitles
@@ -43,12 +200,29 @@ def process_video(youtube_url: str, embedding_model: str = "huggingface", langua
         existing_db = get_existing_vector_db(video_id, embedding_model)
         if existing_db:
             app_state.vectordb = existing_db
+            clear_chat_caches()
             
-            # We need to retrieve the video info and subtitles
-            # This could be stored in the database metadata, but for simplicity we'll re-fetch
-            result = get_youtube_subtitles(youtube_url, [language])
+            # Restore the video info and subtitles saved when the video was processed
+            video_info = load_video_metadata(video_id)
+            subtitles = restore_subtitles_from_db(existing_db) if video_info else []
+            blocks = restore_blocks_from_metadata(video_info, subtitles) if subtitles else None
             
-            if result["success"]:
+            if blocks is not None:
+                app_state.subtitles = subtitles
+                app_state.video_info = video_info
+                app_state.subtitle_blocks = BlockTable.from_blocks(blocks)
+                app_state.table_of_contents = generate_table_of_contents(app_state.subtitle_blocks)
+            else:
+                # Metadata is missing or incomplete, re-fetch from YouTube
+                result = get_youtube_subtitles(youtube_url, [language])
+                
+                if not result["success"]:
+                    return (
+                        f"❌ Failed to extract subtitles: {result.get('error', 'Unknown error')}",
+                        "",
+                        ""
+                    )
+                
                 subtitles = result["subtitles"]
                 video_info = result["video_info"]
                 
@@ -57,35 +231,27 @@ def process_video(youtube_url: str, embedding_model: str = "huggingface", langua
                 
                 # Разбиваем субтитры на блоки
                 blocks, toc = process_subtitles_with_blocks(subtitles, video_info)
-                # Setup QA chain
-                app_state.qa_chain = setup_qa_chain(app_state.vectordb, "huggingface")
-                
-                # Create formatted outputs
-                video_info_html = f"""
-                <div style="display: flex; align-items: center; margin-bottom: 20px;">
-                    <img src="{video_info.get('thumbnail', '')}" style="width: 120px; margin-right: 15px;">
-                    <div>
-                        <h3>{video_info.get('title', 'Unknown title')}</h3>
-                        <p>By: {video_info.get('author', 'Unknown')}</p>
-                        <p>Language: {video_info.get('language', 'Unknown')}</p>
-                        <p>Blocks: {len(blocks)}</p>
-                    </div>
-                </div>
-                """
                 
-                subtitles_markdown = format_subtitles(subtitles)
-                
-                return (
-                    f"✅ Video already processed. Loaded existing data for video ID: {video_id}",
-                    video_info_html,
-                    subtitles_markdown
-                )
-            else:
-                return (
-                    f"❌ Failed to extract subtitles: {result.get('error', 'Unknown error')}",
-                    "",
-                    ""
-                )
+                # Store the blocks with ranges over the stored documents, so the
+                # next open of this video is served from metadata.json
+                stored = restore_subtitles_from_db(existing_db)
+                if stored:
+                    add_block_subtitle_ranges(video_info, [s["start"] for s in stored])
+                    save_video_metadata(video_id, video_info)
+            
+            # Setup QA chain
+            app_state.qa_chain = setup_qa_chain(app_state.vectordb, "huggingface")
+            
+            # Create formatted outputs
+            video_info_html = render_video_info_html(video_info, len(blocks))
+            
+            subtitles_markdown = format_subtitles(subtitles)
+            
+            return (
+                f"✅ Video already processed. Loaded existing data for video ID: {video_id}",
+                video_info_html,
+                subtitles_markdown
+            )
         
         # Extract subtitles
         result = get_youtube_subtitles(youtube_url, [language])
@@ -111,24 +277,18 @@ def process_video(youtube_url: str, embedding_model: str = "huggingface", langua
         # Process subtitles into documents
         documents = process_subtitles_to_documents(subtitles, video_info)
         
+        # Remember which stored documents belong to each block for fast reloads
+        add_block_document_ranges(video_info, documents)
+        
         # Create vector database with metadata
         app_state.vectordb = create_vector_db(documents, embedding_model, video_id, video_info)
+        clear_chat_caches()
         
         # Setup QA chain
         app_state.qa_chain = setup_qa_chain(app_state.vectordb, "huggingface")
         
         # Create formatted outputs
-        video_info_html = f"""
-        <div style="display: flex; align-items: center; margin-bottom: 20px;">
-            <img src="{video_info.get('thumbnail', '')}" style="width: 120px; margin-right: 15px;">
-            <div>
-                <h3>{video_info.get('title', 'Unknown title')}</h3>
-                <p>By: {video_info.get('author', 'Unknown')}</p>
-                <p>Language: {video_info.get('language', 'Unknown')}</p>
-                <p>Blocks: {len(blocks)}</p>
-            </div>
-        </div>
-        """
+        video_info_html = render_video_info_html(video_info, len(blocks))
         
         subtitles_markdown = format_subtitles(subtitles)
         
@@ -185,76 +345,29 @@ def load_database_from_list(db_info):
         # Сохраняем базу данных в состояние приложения
         app_state.vectordb = vectordb
         app_state.video_info = video_info
+        clear_chat_caches()
         
         # Восстанавливаем субтитры из базы данных
-        try:
-            # Получаем несколько документов для восстановления субтитров
-            results = vectordb.similarity_search("", k=50)
-            subtitles = []
-            
-            for doc in results:
-                timestamp = doc.metadata.get("timestamp")
-                if timestamp is not None:
-                    text = doc.page_content
-                    
-                    # Создаем запись субтитра
-                    subtitle = {
-                        "start": timestamp,
-                        "duration": 5,  # Примерная длительность
-                        "text": text
-                    }
-                    subtitles.append(subtitle)
-            
-            # Сортируем субтитры по времени начала
-            subtitles.sort(key=lambda x: x["start"])
-            
-            # Сохраняем субтитры в состояние приложения
-            app_state.subtitles = subtitles
-        except Exception as e:
-            logger.warning(f"Не удалось восстановить субтитры: {e}")
-            app_state.subtitles = []
+        app_state.subtitles = restore_subtitles_from_db(vectordb)
         
         # Проверяем наличие информации о блоках в метаданных
-        if "blocks" in video_info:
-            blocks = []
-            
-            # Восстанавливаем блоки из метаданных
-            for block_meta in video_info["blocks"]:
-                # Фильтруем субтитры для этого блока
-                block_subtitles = [
-                    s for s in app_state.subtitles 
-                    if s["start"] >= block_meta["start_time"] and s["start"] <= block_meta["end_time"]
-                ]
-                
-                block = {
-                    "start_time": block_meta["start_time"],
-                    "end_time": block_meta["end_time"],
-                    "title": block_meta["title"],
-                    "subtitles": block_subtitles,
-                    "content_text": " ".join([s["text"] for s in block_subtitles])
-                }
-                
-                blocks.append(block)
-            
-            app_state.subtitle_blocks = blocks
+        blocks = restore_blocks_from_metadata(video_info, app_state.subtitles)
+        if blocks is not None:
+            app_state.subtitle_blocks = BlockTable.from_blocks(blocks)
             
             # Генерируем оглавление
-            app_state.table_of_contents = generate_table_of_contents(blocks)
+            app_state.table_of_contents = generate_table_of_contents(app_state.subtitle_blocks)
         
         # Создаем QA цепочку
         app_state.qa_chain = setup_qa_chain(app_state.vectordb, "huggingface")
         
         # Создаем форматированный вывод
-        video_info_html = f"""
-        <div style="display: flex; align-items: center; margin-bottom: 20px;">
-            <div>
-                <h3>{video_info.get('title', 'Неизвестное название')}</h3>
-                <p>ID: {video_id}</p>
-                <p>Язык: {video_info.get('language', 'Неизвестен')}</p>
-                <p>Создано: {video_info.get('created_at', 'Неизвестно')}</p>
-            </div>
-        </div>
-        """
+        video_info_html = _DATABASE_INFO_TMPL.substitute(
+            title=video_info.get('title', 'Неизвестное название'),
+            video_id=video_id,
+            language=video_info.get('language', 'Неизвестен'),
+            created_at=video_info.get('created_at', 'Неизвестно')
+        )
         
         # Форматируем субтитры
         subtitles_markdown = format_subtitles(app_state.subtitles)
@@ -279,14 +392,8 @@ def load_database_from_list(db_info):
 # ==============================================
 # 9. GRADIO INTERFACE
 # ==============================================
-def create_gradio_interface():
-    """Create Gradio interface with database loading functionality
-    
-    Returns:
-        Gradio interface
-    """
-    # CSS для стилизации
-    css = """
+# CSS для стилизации
+_CSS = """
     .container {max-width: 1000px; margin: auto;}
     .title {text-align: center; margin-bottom: 20px;}
     .subtitle {text-align: center; margin-bottom: 30px; color: #666;}
@@ -296,16 +403,26 @@ def create_gradio_interface():
     .block-item {padding: 8px; margin: 5px 0; border: 1px solid #ddd; border-radius: 5px; cursor: pointer;}
     .block-item:hover {background-color: #f0f8ff;}
     """
-    
-    with gr.Blocks(css=css) as demo:
-        gr.HTML("""
+
+# Заголовок страницы
+_HEADER_HTML = """
         <div class="title">
             <h1>Обработчик субтитров YouTube</h1>
         </div>
         <div class="subtitle">
             <p>Извлечение, анализ и чат с субтитрами YouTube видео</p>
         </div>
-        """)
+        """
+
+
+def create_gradio_interface():
+    """Create Gradio interface with database loading functionality
+    
+    Returns:
+        Gradio interface
+    """
+    with gr.Blocks(css=_CSS) as demo:
+        gr.HTML(_HEADER_HTML)
         
         # Общие элементы для обоих режимов
         status_html = gr.HTML(label="Статус")
@@ -323,22 +440,13 @@ def create_gradio_interface():
                             interactive=True
                         )
                         language_dropdown = gr.Dropdown(
-                            choices=[
-                                {"value": "en", "text": "English"},
-                                {"value": "ru", "text": "Russian"},
-                                {"value": "es", "text": "Spanish"},
-                                {"value": "fr", "text": "French"},
-                                {"value": "de", "text": "German"}
-                            ],
+                            choices=AVAILABLE_LANGUAGES,
                             value="en",
                             label="Предпочитаемый язык субтитров",
                             interactive=True
                         )
                         embedding_dropdown = gr.Dropdown(
-                            choices=[
-                                {"value": "huggingface", "text": "HuggingFace Embeddings"},
-                                {"value": "openai", "text": "OpenAI Embeddings"}
-                            ],
+                            choices=EMBEDDING_MODELS,
                             value="huggingface",
                             label="Модель эмбеддингов",
                             interactive=True
@@ -395,16 +503,7 @@ def create_gradio_interface():
             with gr.Tab(label="Перевод"):
                 with gr.Row():
                     target_lang_dropdown = gr.Dropdown(
-                        choices=[
-                            {"value": "en", "text": "English"},
-                            {"value": "ru", "text": "Russian"},
-                            {"value": "es", "text": "Spanish"},
-                            {"value": "fr", "text": "French"},
-                            {"value": "de", "text": "German"},
-                            {"value": "zh", "text": "Chinese"},
-                            {"value": "ja", "text": "Japanese"},
-                            {"value": "it", "text": "Italian"}
-                        ],
+                        choices=TRANSLATION_LANGUAGES,
                         value="en",
                         label="Перевести на",
                         interactive=True
@@ -416,11 +515,7 @@ def create_gradio_interface():
             with gr.Tab(label="Чат"):
                 with gr.Row():
                     chat_model_dropdown = gr.Dropdown(
-                        choices=[
-                            {"value": "huggingface", "text": "HuggingFace Model"},
-                            {"value": "openai", "text": "OpenAI Model"},
-                            {"value": "groq", "text": "Groq Model"}
-                        ],
+                        choices=CHAT_MODELS,
                         value="huggingface",
                         label="Модель чата",
                         interactive=True
@@ -439,7 +534,7 @@ def create_gradio_interface():
                 clear_btn = gr.Button("Очистить историю чата")
         
         # Обновленная функция process_video_and_update_toc с поддержкой глав
-        def process_video_and_update_toc(url, embed_model, lang):
+        async def process_video_and_update_toc(url, embed_model, lang):
             """
             Обрабатывает видео и обновляет оглавление и список блоков
             
@@ -463,7 +558,9 @@ def create_gradio_interface():
             
             # Обрабатываем видео
             try:
-                result = process_video(url, embed_model, lang)  # Исправлено: использование правильной функции
+                # Загрузка субтитров, эмбеддинги и запись в Chroma блокируют поток,
+                # поэтому выполняются вне цикла событий Gradio
+                result = await asyncio.to_thread(process_video, url, embed_model, lang)  # Исправлено: использование правильной функции
             except Exception as e:
                 logger.error(f"Error processing video: {e}")
                 return (
@@ -477,13 +574,11 @@ def create_gradio_interface():
             # После обработки видео обновляем оглавление и список блоков
             toc = "Оглавление не найдено"
             try:
-                if hasattr(app_state, 'table_of_contents') and app_state.table_of_contents:
+                if app_state.table_of_contents:
                     toc = app_state.table_of_contents
                     
                     # Проверяем наличие глав YouTube
-                    has_youtube_chapters = False
-                    if hasattr(app_state, 'video_info'):
-                        has_youtube_chapters = app_state.video_info.get("has_chapters", False)
+                    has_youtube_chapters = app_state.video_info.get("has_chapters", False)
                     
                     if has_youtube_chapters:
                         # Добавляем информацию о главах в статус
@@ -496,30 +591,8 @@ def create_gradio_interface():
             # Обновляем выпадающий список блоков с более информативными названиями
             blocks_choices = []
             try:
-                if hasattr(app_state, 'subtitle_blocks') and app_state.subtitle_blocks:
-                    for i, block in enumerate(app_state.subtitle_blocks):
-                        try:
-                            start_time = format_time(block.get("start_time", 0))
-                            title = block.get("title", f"Раздел {i+1}")
-                            
-                            # Сокращаем заголовок для выпадающего списка, если он слишком длинный
-                            dropdown_title = title
-                            if len(dropdown_title) > 40:
-                                dropdown_title = dropdown_title[:37] + "..."
-                            
-                            # Добавляем значок для глав YouTube
-                            chapter_icon = "🔖 " if block.get("is_youtube_chapter", False) else ""
-                            
-                            blocks_choices.append({
-                                "value": str(i),
-                                "text": f"{start_time} - {chapter_icon}{dropdown_title}"
-                            })
-                        except Exception as e:
-                            logger.warning(f"Error formatting block for dropdown: {e}")
-                            blocks_choices.append({
-                                "value": str(i),
-                                "text": f"Раздел {i+1} ({start_time})"
-                            })
+                if app_state.subtitle_blocks:
+                    blocks_choices = build_block_choices(app_state.subtitle_blocks)
             except Exception as e:
                 logger.error(f"Error generating blocks dropdown: {e}")
             
@@ -561,7 +634,8 @@ def create_gradio_interface():
         process_btn.click(
             fn=process_video_and_update_toc,
             inputs=[youtube_url, embedding_dropdown, language_dropdown],
-            outputs=[status_html, video_info_html, subtitles_markdown, table_of_contents, block_dropdown]
+            outputs=[status_html, video_info_html, subtitles_markdown, table_of_contents, block_dropdown],
+            queue=True
         )
         
         # Обновление списка баз данных
@@ -578,7 +652,7 @@ def create_gradio_interface():
         )
         
         # Загрузка выбранной базы данных и обновление оглавления
-        def load_selected_db_and_update_toc(selected_db_id):
+        async def load_selected_db_and_update_toc(selected_db_id):
             # Если ID не выбран, возвращаем предупреждение
             if not selected_db_id:
                 return (
@@ -603,7 +677,7 @@ def create_gradio_interface():
             
             # Загружаем базу данных
             try:
-                status, info, subtitles = load_database_from_list(selected_db_id)
+                status, info, subtitles = await asyncio.to_thread(load_database_from_list, selected_db_id)
             except Exception as e:
                 logger.error(f"Error loading database: {e}")
                 return (
@@ -619,39 +693,21 @@ def create_gradio_interface():
             blocks_choices = []
             
             try:
-                if hasattr(app_state, 'subtitles') and app_state.subtitles:
+                if app_state.subtitles:
                     # Разбиваем субтитры на блоки, если они еще не разбиты
-                    if not hasattr(app_state, 'subtitle_blocks') or not app_state.subtitle_blocks:
+                    if not app_state.subtitle_blocks:
                         try:
-                            blocks, toc = process_subtitles_with_blocks(app_state.subtitles, app_state.video_info)
+                            blocks, toc = await asyncio.to_thread(
+                                process_subtitles_with_blocks, app_state.subtitles, app_state.video_info
+                            )
                         except Exception as e:
                             logger.error(f"Error processing subtitles into blocks: {e}")
                     else:
-                        if hasattr(app_state, 'table_of_contents'):
-                            toc = app_state.table_of_contents
+                        toc = app_state.table_of_contents
                     
                     # Обновляем выпадающий список блоков с более информативными названиями
-                    if hasattr(app_state, 'subtitle_blocks') and app_state.subtitle_blocks:
-                        for i, block in enumerate(app_state.subtitle_blocks):
-                            try:
-                                start_time = format_time(block.get("start_time", 0))
-                                title = block.get("title", f"Раздел {i+1}")
-                                
-                                # Сокращаем заголовок для выпадающего списка
-                                dropdown_title = title
-                                if len(dropdown_title) > 40:
-                                    dropdown_title = dropdown_title[:37] + "..."
-                                
-                                blocks_choices.append({
-                                    "value": str(i),
-                                    "text": f"{start_time} - {dropdown_title}"
-                                })
-                            except Exception as e:
-                                logger.warning(f"Error formatting block for dropdown: {e}")
-                                blocks_choices.append({
-                                    "value": str(i),
-                                    "text": f"Раздел {i+1}"
-                                })
+                    if app_state.subtitle_blocks:
+                        blocks_choices = build_block_choices(app_state.subtitle_blocks)
             except Exception as e:
                 logger.error(f"Error updating table of contents: {e}")
             
@@ -660,7 +716,8 @@ def create_gradio_interface():
         load_db_btn.click(
             fn=load_selected_db_and_update_toc,
             inputs=[db_dropdown],
-            outputs=[status_html, video_info_html, subtitles_markdown, table_of_contents, block_dropdown]
+            outputs=[status_html, video_info_html, subtitles_markdown, table_of_contents, block_dropdown],
+            queue=True
         )
         
         # Функция для обработки выбора блока из оглавления
@@ -696,7 +753,7 @@ def create_gradio_interface():
                 Строка в формате Markdown с содержимым блока
             """
             # Проверяем, есть ли блоки субтитров
-            if not hasattr(app_state, 'subtitle_blocks') or not app_state.subtitle_blocks:
+            if not app_state.subtitle_blocks:
                 return "Блоки субтитров не найдены. Сначала обработайте видео."
             
             # Обработка значения из выпадающего списка Gradio
@@ -718,27 +775,29 @@ def create_gradio_interface():
                 # Получаем блок по индексу
                 block = app_state.subtitle_blocks[block_index]
                 
-                # Форматируем содержимое блока
-                content = f"## {block.get('title', f'Блок {block_index+1}')}\n\n"
+                # Форматируем содержимое блока (части собираются в список и склеиваются один раз)
+                ft = format_time
+                parts = [f"## {block.get('title', f'Блок {block_index+1}')}\n\n"]
                 
                 # Проверяем наличие временных меток
                 if "start_time" in block and "end_time" in block:
-                    content += f"**Временная метка:** {format_time(block['start_time'])} - {format_time(block['end_time'])}\n\n"
+                    parts.append(f"**Временная метка:** {ft(block['start_time'])} - {ft(block['end_time'])}\n\n")
                 
-                content += "### Содержание:\n\n"
+                parts.append("### Содержание:\n\n")
                 
                 # Добавляем субтитры блока с временными метками
-                if "subtitles" in block and block["subtitles"]:
-                    for subtitle in block["subtitles"]:
-                        if "start" in subtitle:
-                            timestamp = format_time(subtitle["start"])
-                            text = subtitle.get("text", "")
-                            content += f"**[{timestamp}]** {text}\n\n"
+                subtitles = block.get("subtitles") or ()
+                if subtitles:
+                    parts.extend(
+                        f"**[{ft(subtitle['start'])}]** {subtitle.get('text', '')}\n\n"
+                        for subtitle in subtitles
+                        if "start" in subtitle
+                    )
                 else:
                     # Если субтитры отсутствуют, показываем основной текст блока
-                    content += block.get("content_text", "Содержимое недоступно.")
+                    parts.append(block.get("content_text", "Содержимое недоступно."))
                 
-                return content
+                return "".join(parts)
             except (ValueError, TypeError) as e:
                 # Ошибка преобразования в int или другая ошибка типа
                 logger.error(f"Error in display_block_content: {e}")
@@ -756,17 +815,21 @@ def create_gradio_interface():
         )
         
         # Перевод субтитров
+        # Запросы нескольких пользователей объединяются в один вызов
         translate_btn.click(
-            fn=translate_subtitle_text,
+            fn=translate_subtitle_texts,
             inputs=[target_lang_dropdown],
-            outputs=[translated_output]
+            outputs=[translated_output],
+            batch=True,
+            max_batch_size=16
         )
         
         # Чат с субтитрами
         chat_btn.click(
             fn=chat_with_subtitles,
             inputs=[chat_input, chatbot, chat_model_dropdown],
-            outputs=[chatbot]
+            outputs=[chatbot],
+            queue=True
         ).then(
             lambda: "", # Очистка ввода после отправки
             None,
@@ -774,7 +837,7 @@ def create_gradio_interface():
         )
         
         clear_btn.click(
-            fn=lambda: [],
+            fn=clear_chat_history,
             inputs=None,
             outputs=[chatbot]
         )
@@ -786,14 +849,19 @@ def create_gradio_interface():
             outputs=[db_dropdown]
         )
     
+    # Очередь нужна для потоковой передачи ответов чата (генераторов);
+    # несколько обработчиков работают одновременно, чтобы потоки разных пользователей не ждали друг друга
+    demo.queue(concurrency_count=APP_SETTINGS["queue_concurrency"], max_size=64)
+    
     return demo
 
 # Функция-обертка для кнопки обработки видео
-def process_btn_wrapper(url, embed_model, lang):
+async def process_btn_wrapper(url, embed_model, lang):
     if isinstance(embed_model, dict):
         embed_model = embed_model.get("value", "huggingface")
     
     if isinstance(lang, dict):
         lang = lang.get("value", "en")
     
-    return process_video(url, embed_model, lang)
\ No newline at end of file
+    # Обработка видео блокирует поток, поэтому выполняется вне цикла событий
+    return await asyncio.to_thread(process_video, url, embed_model, lang)
\ No newline at end of file
@@ -0,0 +1,101 @@
+import os
+import numpy as np
+from typing import List
+from langchain_core.embeddings import Embeddings
+from src.config import logger, ONNX_MODEL_PATH
+
+
+# File name of the int8 quantized model inside the export directory
+ONNX_INT8_FILE = "model_int8.onnx"
+
+
+def export_quantized_model(model_name: str, output_dir: str = ONNX_MODEL_PATH) -> str:
+    """Export a sentence-transformers model to ONNX and quantize it to int8
+
+    One-time step; needs the optional `optimum[onnxruntime]` package.
+    Run with `python -m src.onnx_embeddings`.
+
+    Args:
+        model_name: HuggingFace model name
+        output_dir: Directory for the exported model and tokenizer
+
+    Returns:
+        Path of the quantized model
+    """
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    from transformers import AutoTokenizer
+
+    model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+    model.save_pretrained(output_dir)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(output_dir)
+
+    int8_path = os.path.join(output_dir, ONNX_INT8_FILE)
+    quantize_dynamic(os.path.join(output_dir, "model.onnx"), int8_path, weight_type=QuantType.QInt8)
+    logger.info(f"Exported int8 ONNX model to {int8_path}")
+    return int8_path
+
+
+class OnnxMiniLMEmbeddings(Embeddings):
+    """Sentence embeddings from an int8 ONNX export of a MiniLM model
+
+    Runs on the ONNX Runtime CPU provider and reproduces the
+    sentence-transformers pipeline: mean pooling over the attention mask
+    followed by L2 normalization.
+    """
+    def __init__(self, model_dir: str = ONNX_MODEL_PATH, batch_size: int = 64, max_length: int = 256):
+        from onnxruntime import InferenceSession
+        from transformers import AutoTokenizer
+
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir, use_fast=True)
+        self.session = InferenceSession(
+            os.path.join(model_dir, ONNX_INT8_FILE),
+            providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        inputs = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="np"
+        )
+        feed = {name: value.astype(np.int64) for name, value in inputs.items() if name in self._input_names}
+        token_embeddings = self.session.run(None, feed)[0]
+
+        mask = inputs["attention_mask"][..., np.newaxis].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._embed(texts[start:start + self.batch_size]).tolist())
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+
+def load_onnx_embeddings(model_dir: str = ONNX_MODEL_PATH):
+    """Load the int8 ONNX embeddings if the model has been exported
+
+    Returns:
+        OnnxMiniLMEmbeddings or None if the export or onnxruntime is missing
+    """
+    if not os.path.exists(os.path.join(model_dir, ONNX_INT8_FILE)):
+        return None
+    try:
+        return OnnxMiniLMEmbeddings(model_dir)
+    except Exception as e:
+        logger.warning(f"Could not load ONNX embedding model from {model_dir}: {e}")
+        return None
+
+
+if __name__ == "__main__":
+    from src.processing import EMBEDDING_MODEL_NAMES
+    export_quantized_model(EMBEDDING_MODEL_NAMES["huggingface"])
@@ -1,6 +1,13 @@
 import os
 import json
+import uuid
+import bisect
+import functools
 import logging
+import threading
+import numpy as np
+from collections import OrderedDict
+from operator import itemgetter
 from typing import List, Dict, Any
 from datetime import datetime
 from langchain_core.documents import Document
@@ -9,19 +16,135 @@ from langchain_chroma import Chroma
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_openai import OpenAIEmbeddings
 from src.config import logger, DB_PATH, api_status
+from src.embedding_cache import CachedEmbeddings
+from src.utils import format_times_batch
+
+# orjson разбирает и сериализует metadata.json в разы быстрее стандартного json
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # ==============================================
 # 4. SUBTITLE PROCESSING FOR VECTOR DATABASE
 # ==============================================
 
-def process_subtitles_to_documents(subtitles: List[Dict], video_info: Dict, chunk_size: int = 1000, chunk_overlap: int = 100) -> List[Document]:
+# Embedding model used by each provider
+EMBEDDING_MODEL_NAMES = {
+    "openai": "text-embedding-3-small",
+    "huggingface": "sentence-transformers/all-MiniLM-L6-v2"
+}
+
+# Recently opened vector databases, most recently used last
+_VECTOR_DBS = OrderedDict()
+_VECTOR_DBS_LOCK = threading.Lock()
+_VECTOR_DBS_MAX_SIZE = 4
+
+# Разобранные metadata.json сохраненных баз: путь -> (st_mtime_ns, метаданные)
+_METADATA_CACHE = {}
+
+# Tokenizer used to measure chunk length: the default embedding model's own,
+# so chunks fit its input window (256 tokens for all-MiniLM-L6-v2)
+SPLITTER_TOKENIZER = EMBEDDING_MODEL_NAMES["huggingface"]
+
+# Largest chunk that is not truncated by the embedder: max_seq_length of
+# all-MiniLM-L6-v2 (256) includes [CLS] and [SEP], while both splitters
+# count tokens without special tokens. The tokenizer's own model_max_length
+# (512) is not the limit the embedder applies, so it is not used here
+EMBEDDING_MAX_SEQ_LENGTH = 256
+CHUNK_TOKENS = EMBEDDING_MAX_SEQ_LENGTH - 2
+
+
+@functools.lru_cache(maxsize=1)
+def _get_splitter_tokenizer():
+    """Load the chunk-length tokenizer once per process
+
+    Returns:
+        Tokenizer or None if it cannot be loaded
+    """
+    try:
+        from transformers import AutoTokenizer
+        return AutoTokenizer.from_pretrained(SPLITTER_TOKENIZER)
+    except Exception as e:
+        logger.warning(f"Could not load tokenizer {SPLITTER_TOKENIZER}, splitting by characters: {e}")
+        return None
+
+
+def _split_text_with_offsets(full_text: str, chunk_size: int, chunk_overlap: int,
+                             chunk_tokens: int, chunk_overlap_tokens: int) -> List[tuple]:
+    """Split text into chunks and return (offset, chunk) pairs
+
+    Uses the Rust-backed semantic-text-splitter when it is installed: it is
+    much faster on long transcripts and reports chunk offsets directly.
+    Otherwise falls back to LangChain's splitter and locates each chunk in
+    the text.
+    """
+    tokenizer = _get_splitter_tokenizer()
+    
+    try:
+        from semantic_text_splitter import TextSplitter
+    except ImportError:
+        TextSplitter = None
+    
+    if TextSplitter is not None:
+        try:
+            if tokenizer is not None and getattr(tokenizer, "backend_tokenizer", None) is not None:
+                splitter = TextSplitter.from_huggingface_tokenizer(
+                    tokenizer.backend_tokenizer, capacity=chunk_tokens, overlap=chunk_overlap_tokens
+                )
+            else:
+                splitter = TextSplitter(capacity=chunk_size, overlap=chunk_overlap)
+            chunks = splitter.chunk_indices(full_text)
+            # Offsets are character offsets in recent versions; older ones report bytes
+            if all(full_text.startswith(chunk, offset) for offset, chunk in chunks):
+                return chunks
+            return _locate_chunks(full_text, [chunk for _, chunk in chunks])
+        except Exception as e:
+            logger.warning(f"semantic-text-splitter failed, using LangChain splitter: {e}")
+    
+    if tokenizer is not None:
+        text_splitter = RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+            tokenizer,
+            chunk_size=chunk_tokens,
+            chunk_overlap=chunk_overlap_tokens,
+        )
+    else:
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=len,
+        )
+    return _locate_chunks(full_text, text_splitter.split_text(full_text))
+
+
+def _locate_chunks(full_text: str, texts: List[str]) -> List[tuple]:
+    """Return (offset, chunk) pairs for chunks that are ordered substrings of full_text"""
+    chunks = []
+    search_from = 0
+    for text_chunk in texts:
+        chunk_start_pos = full_text.find(text_chunk, search_from)
+        if chunk_start_pos < 0:
+            chunk_start_pos = search_from
+        search_from = chunk_start_pos + 1
+        chunks.append((chunk_start_pos, text_chunk))
+    return chunks
+
+
+def process_subtitles_to_documents(subtitles: List[Dict], video_info: Dict, chunk_size: int = 1000, chunk_overlap: int = 100,
+                                   chunk_tokens: int = CHUNK_TOKENS, chunk_overlap_tokens: int = 32) -> List[Document]:
     """Convert subtitles to Document objects for vector database
     
+    Chunks are measured in embedding-model tokens, which keeps them the same
+    size for the model regardless of language. Character sizes are used only
+    when the tokenizer is unavailable.
+    
     Args:
         subtitles: List of subtitle dictionaries
         video_info: Dictionary with video information
-        chunk_size: Size of each text chunk
-        chunk_overlap: Overlap between chunks
+        chunk_size: Size of each text chunk in characters (fallback)
+        chunk_overlap: Overlap between chunks in characters (fallback)
+        chunk_tokens: Size of each text chunk in tokens
+        chunk_overlap_tokens: Overlap between chunks in tokens
         
     Returns:
         List of Document objects
@@ -30,42 +153,32 @@ def process_subtitles_to_documents(subtitles: List[Dict], video_info: Dict, chun
         return []
     
     # Combine adjacent subtitles into a single text
-    full_text = ""
-    timestamps = []
+    subtitle_texts = [subtitle.get('text', '') for subtitle in subtitles]
+    full_text = " ".join(subtitle_texts)
     
-    for subtitle in subtitles:
-        start_time = subtitle.get('start', 0)
-        text = subtitle.get('text', '')
-        
-        full_text += text + " "
-        timestamps.append((len(full_text) - len(text), start_time))
+    # Start time and start offset in full_text of every subtitle (offsets are sorted)
+    starts = np.fromiter((subtitle.get('start', 0) for subtitle in subtitles), dtype=np.float64, count=len(subtitles))
+    lengths = np.fromiter((len(text) + 1 for text in subtitle_texts), dtype=np.int64, count=len(subtitles))
+    positions = np.cumsum(lengths) - lengths
     
-    # Create a text splitter
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        length_function=len,
-    )
+    # Split text into chunks together with their offsets in full_text
+    # Identical chunks (repeated intros, ads) are embedded only once by CachedEmbeddings
+    chunks = _split_text_with_offsets(full_text, chunk_size, chunk_overlap, chunk_tokens, chunk_overlap_tokens)
     
-    # Split text into chunks
-    texts = text_splitter.split_text(full_text)
+    # Start time of the first subtitle that starts within each chunk, for all
+    # chunks at once (binary search over offsets)
+    chunk_starts = np.fromiter((offset for offset, _ in chunks), dtype=np.int64, count=len(chunks))
+    chunk_ends = chunk_starts + np.fromiter((len(text) for _, text in chunks), dtype=np.int64, count=len(chunks))
+    idx = np.minimum(np.searchsorted(positions, chunk_starts, side='left'), len(positions) - 1)
+    found = (positions[idx] >= chunk_starts) & (positions[idx] <= chunk_ends)
+    start_times = np.where(found, starts[idx], 0.0)
+    
+    # Time in HH:MM:SS format
+    time_strs = format_times_batch(start_times)
     
     # Create Document objects with metadata
     documents = []
-    for i, text_chunk in enumerate(texts):
-        # Find the timestamps that fall within this chunk
-        chunk_start_pos = i * (chunk_size - chunk_overlap) if i > 0 else 0
-        chunk_end_pos = chunk_start_pos + len(text_chunk)
-        
-        # Find the closest timestamp for this chunk
-        relevant_timestamps = [ts for pos, ts in timestamps if pos >= chunk_start_pos and pos <= chunk_end_pos]
-        start_time = relevant_timestamps[0] if relevant_timestamps else 0
-        
-        # Calculate time in HH:MM:SS format
-        minutes, seconds = divmod(int(start_time), 60)
-        hours, minutes = divmod(minutes, 60)
-        time_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-        
+    for i, ((_, text_chunk), start_time, time_str) in enumerate(zip(chunks, start_times.tolist(), time_strs)):
         # Create document with metadata
         doc = Document(
             page_content=text_chunk,
@@ -84,6 +197,32 @@ def process_subtitles_to_documents(subtitles: List[Dict], video_info: Dict, chun
     return documents
 
 
+def add_block_document_ranges(video_info: Dict, documents: List[Document]) -> None:
+    """Store the document index range of every block in the video metadata
+    
+    The ranges index the documents sorted by timestamp, i.e. the subtitle
+    list restored from the vector database, so loading a block is a slice.
+    
+    Args:
+        video_info: Dictionary with video information and block metadata
+        documents: Documents stored in the vector database
+    """
+    add_block_subtitle_ranges(video_info, sorted(doc.metadata["timestamp"] for doc in documents))
+
+
+def add_block_subtitle_ranges(video_info: Dict, starts: List[float]) -> None:
+    """Store the index range of every block in a sorted list of start times
+    
+    Args:
+        video_info: Dictionary with video information and block metadata
+        starts: Sorted start times of the stored documents
+    """
+    for block_meta in video_info.get("blocks", []):
+        start_idx = bisect.bisect_left(starts, block_meta["start_time"])
+        block_meta["subtitle_start_idx"] = start_idx
+        block_meta["subtitle_end_idx"] = bisect.bisect_right(starts, block_meta["end_time"], start_idx)
+
+
 def get_embedding_model(model_name: str = "huggingface"):
     """Get embedding model based on selection
     
@@ -97,15 +236,120 @@ def get_embedding_model(model_name: str = "huggingface"):
     if isinstance(model_name, dict):
         model_name = model_name.get("value", "huggingface")
     
-    if model_name == "openai" and api_status["openai"]:
-        return OpenAIEmbeddings(
-            model="text-embedding-3-small"
-        )
+    # Default to HuggingFace when OpenAI is not selected or not configured
+    provider = "openai" if model_name == "openai" and api_status["openai"] else "huggingface"
+    return _get_embedder(provider, EMBEDDING_MODEL_NAMES[provider])
+
+
+@functools.lru_cache(maxsize=1)
+def configure_torch_threads():
+    """Set the number of intra-op CPU threads used by torch, once per process
+    
+    The thread count can be overridden with the TORCH_NUM_THREADS variable.
+    """
+    try:
+        import torch
+        num_threads = int(os.environ.get("TORCH_NUM_THREADS", 0)) or os.cpu_count() or 1
+        torch.set_num_threads(num_threads)
+        logger.info(f"Torch uses {num_threads} CPU threads")
+    except Exception as e:
+        logger.warning(f"Could not configure torch threads: {e}")
+
+
+@functools.lru_cache(maxsize=1)
+def detect_device() -> str:
+    """Return the best available torch device: cuda, mps or cpu"""
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return "cuda"
+        if torch.backends.mps.is_available():
+            return "mps"
+    except Exception as e:
+        logger.warning(f"Could not detect torch device, using CPU: {e}")
+    return "cpu"
+
+
+@functools.lru_cache(maxsize=4)
+def _get_embedder(provider: str, model_name: str):
+    """Create an embedding model once per process
+    
+    Loading the HuggingFace weights takes seconds, so every video and every
+    database load reuses the same warm instance.
+    """
+    # Vectors of already seen texts are reused from the embedding cache
+    if provider == "openai":
+        embeddings = OpenAIEmbeddings(model=model_name)
     else:
-        # Default to HuggingFace
-        return HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
+        # all-MiniLM-L6-v2 is already a small 384-dimensional model; switching
+        # models would make the collections built with it unusable
+        device = detect_device()
+        if device == "cpu":
+            # On CPU prefer the int8 ONNX export of the same model when it exists
+            from src.onnx_embeddings import load_onnx_embeddings
+            onnx_embeddings = load_onnx_embeddings()
+            if onnx_embeddings is not None:
+                logger.info(f"Loading int8 ONNX embedding model for {model_name}")
+                return CachedEmbeddings(onnx_embeddings, namespace=f"{provider}:{model_name}:onnx-int8")
+        
+        configure_torch_threads()
+        logger.info(f"Loading embedding model {model_name} on {device}")
+        embeddings = HuggingFaceEmbeddings(
+            model_name=model_name,
+            model_kwargs={"device": device},
+            encode_kwargs={"batch_size": 64, "normalize_embeddings": True}
         )
+    return CachedEmbeddings(embeddings, namespace=f"{provider}:{model_name}")
+
+
+@functools.lru_cache(maxsize=1)
+def _get_chroma_client():
+    """Open the persistent Chroma client once per process"""
+    import chromadb
+    return chromadb.PersistentClient(path=DB_PATH)
+
+
+def _open_vector_db(collection_name: str, embeddings, create: bool = False):
+    """Return an open vector database handle, reusing recently used ones
+    
+    Handles are kept in a small LRU keyed by collection and embedding model,
+    so reloading a database or switching between recent videos does not
+    reopen the collection.
+    
+    Args:
+        collection_name: Chroma collection name
+        embeddings: Embedding model (CachedEmbeddings)
+        create: Create the collection if it does not exist
+        
+    Returns:
+        Chroma vector database instance or None if the collection does not exist
+    """
+    key = (collection_name, embeddings.namespace)
+    with _VECTOR_DBS_LOCK:
+        vectordb = _VECTOR_DBS.get(key)
+        if vectordb is None:
+            client = _get_chroma_client()
+            if not create:
+                # Look the collection up without creating an empty one
+                try:
+                    client.get_collection(collection_name)
+                except Exception:
+                    return None
+            
+            vectordb = Chroma(
+                client=client,
+                collection_name=collection_name,
+                embedding_function=embeddings,
+                # Embeddings are normalized, so cosine distance is the natural
+                # metric; the setting only applies when the collection is created
+                collection_metadata={"hnsw:space": "cosine"} if create else None
+            )
+            _VECTOR_DBS[key] = vectordb
+        
+        _VECTOR_DBS.move_to_end(key)
+        while len(_VECTOR_DBS) > _VECTOR_DBS_MAX_SIZE:
+            _VECTOR_DBS.popitem(last=False)
+        return vectordb
 
 
 def create_vector_db(documents: List[Document], embedding_model: str = "huggingface", video_id: str = None, video_info: dict = None):
@@ -125,12 +369,41 @@ def create_vector_db(documents: List[Document], embedding_model: str = "huggingf
     collection_name = f"video_{video_id}" if video_id else "subtitles"
     
     # Create vector database
-    vectordb = Chroma.from_documents(
-        documents=documents,
-        embedding=embeddings,
-        collection_name=collection_name,
-        persist_directory=DB_PATH
-    )
+    vectordb = _open_vector_db(collection_name, embeddings, create=True)
+    
+    if documents:
+        texts = [doc.page_content for doc in documents]
+        
+        # Embed all chunks in one batched call and hand the vectors to Chroma,
+        # so the collection never calls the embedding model itself
+        vectors = embeddings.embed_documents(texts)
+        
+        # Chunk ids are stable, so re-processing a video replaces its chunks
+        id_prefix = video_id or collection_name
+        ids = [f"{id_prefix}-{doc.metadata.get('chunk_id', i)}" for i, doc in enumerate(documents)]
+        metadatas = [doc.metadata for doc in documents]
+        
+        batch_size = getattr(vectordb._client, "max_batch_size", None) or len(ids)
+        
+        # Drop chunks the new split no longer has: trailing chunks of a longer
+        # earlier split and rows with random ids written by from_documents
+        new_ids = set(ids)
+        stale_ids = [id_ for id_ in vectordb._collection.get(include=[])["ids"] if id_ not in new_ids]
+        for start in range(0, len(stale_ids), batch_size):
+            vectordb._collection.delete(ids=stale_ids[start:start + batch_size])
+        if stale_ids:
+            logger.info(f"Removed {len(stale_ids)} stale chunks from {collection_name}")
+        
+        # One write per client batch limit (a single transaction for any normal
+        # video); Chroma persists on write, so no separate persist() is needed
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            vectordb._collection.upsert(
+                ids=ids[start:end],
+                embeddings=vectors[start:end],
+                documents=texts[start:end],
+                metadatas=metadatas[start:end]
+            )
     
     # Save metadata if provided
     if video_id and video_info:
@@ -150,18 +423,21 @@ def get_existing_vector_db(video_id: str, embedding_model: str = "huggingface"):
     Returns:
         Chroma vector database instance or None if not found
     """
-    embeddings = get_embedding_model(embedding_model)
     collection_name = f"video_{video_id}"
     
+    # create_vector_db always saves metadata next to the collection, so a
+    # missing directory means there is nothing to open; skip loading the model
+    if not os.path.isdir(os.path.join(DB_PATH, collection_name)):
+        logger.info(f"No existing vector database found for video {video_id}")
+        return None
+    
+    embeddings = get_embedding_model(embedding_model)
+    
     try:
-        vectordb = Chroma(
-            collection_name=collection_name,
-            embedding_function=embeddings,
-            persist_directory=DB_PATH
-        )
+        vectordb = _open_vector_db(collection_name, embeddings)
         
         # Check if the collection exists
-        if vectordb._collection.count() > 0:
+        if vectordb is not None and vectordb._collection.count() > 0:
             logger.info(f"Found existing vector database for video {video_id}")
             return vectordb
         else:
@@ -194,15 +470,7 @@ def load_database_by_id(video_id, embedding_model="huggingface"):
         return (False, None, None, f"База данных для видео {video_id} не найдена")
     
     # Пытаемся загрузить метаданные
-    metadata_path = os.path.join(collection_path, "metadata.json")
-    video_info = None
-    
-    if os.path.exists(metadata_path):
-        try:
-            with open(metadata_path, 'r', encoding='utf-8') as f:
-                video_info = json.load(f)
-        except Exception as e:
-            logger.warning(f"Не удалось загрузить метаданные для {video_id}: {e}")
+    video_info = load_video_metadata(video_id)
     
     # Если метаданные не найдены, создаем базовую информацию
     if not video_info:
@@ -215,19 +483,18 @@ def load_database_by_id(video_id, embedding_model="huggingface"):
     try:
         # Загружаем векторную базу данных
         embeddings = get_embedding_model(embedding_model)
-        vectordb = Chroma(
-            collection_name=collection_name,
-            embedding_function=embeddings,
-            persist_directory=DB_PATH
-        )
+        vectordb = _open_vector_db(collection_name, embeddings)
+        if vectordb is None:
+            return (False, None, None, f"База данных для видео {video_id} не найдена")
         
         # Получаем примерное содержание (если доступно)
         sample_content = None
         try:
-            # Получаем несколько документов для отображения содержимого
-            results = vectordb.similarity_search("", k=3)
-            if results:
-                sample_content = "\n\n".join([doc.page_content for doc in results])
+            # Читаем несколько документов напрямую из хранилища, без эмбеддинга и поиска
+            results = vectordb._collection.get(limit=3, include=["documents"])
+            documents = results.get("documents") or []
+            if documents:
+                sample_content = "\n\n".join(documents)
         except Exception as e:
             logger.warning(f"Не удалось получить примерное содержание: {e}")
         
@@ -238,6 +505,59 @@ def load_database_by_id(video_id, embedding_model="huggingface"):
         return (False, None, None, f"Ошибка загрузки базы данных: {e}")
 
 
+def _read_json(path):
+    """Читает JSON файл (через orjson, если он установлен)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def _write_json_atomic(path, data):
+    """Атомарно записывает JSON: во временный файл, затем os.replace
+    
+    При сбое во время записи на диске остается прежняя версия файла.
+    """
+    if orjson is not None:
+        payload = orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    else:
+        payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+    
+    # Уникальное имя временного файла: параллельные сохранения одного видео
+    # из разных обработчиков очереди не пишут в один и тот же файл
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# Функция для чтения сохраненных метаданных видео
+def load_video_metadata(video_id):
+    """
+    Загружает метаданные видео, сохраненные save_video_metadata
+    
+    Args:
+        video_id (str): ID видео
+        
+    Returns:
+        dict: Информация о видео или None, если метаданные не найдены
+    """
+    metadata_path = os.path.join(DB_PATH, f"video_{video_id}", "metadata.json")
+    
+    if not os.path.exists(metadata_path):
+        return None
+    
+    try:
+        return _read_json(metadata_path)
+    except Exception as e:
+        logger.warning(f"Не удалось загрузить метаданные для {video_id}: {e}")
+        return None
+
+
 # Функция для сохранения метаданных видео
 def save_video_metadata(video_id, video_info):
     """
@@ -248,7 +568,6 @@ def save_video_metadata(video_id, video_info):
         video_info (dict): Информация о видео
     """
     import os
-    import json
     from datetime import datetime
     
     collection_name = f"video_{video_id}"
@@ -264,9 +583,10 @@ def save_video_metadata(video_id, video_info):
     # Сохраняем метаданные в JSON файл
     metadata_path = os.path.join(collection_path, "metadata.json")
     try:
-        with open(metadata_path, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=2)
+        _write_json_atomic(metadata_path, metadata)
         logger.info(f"Метаданные сохранены для {video_id}")
+        # Перезапись metadata.json не меняет время изменения DB_PATH
+        _scan_saved_databases.cache_clear()
     except Exception as e:
         logger.error(f"Не удалось сохранить метаданные для {video_id}: {e}")
 
@@ -276,50 +596,74 @@ def get_saved_databases():
     """
     Получает список всех сохраненных векторных баз данных
     
+    Результат кэшируется по времени изменения DB_PATH: пока в директории
+    не появились и не исчезли коллекции, повторные вызовы не читают диск.
+    
     Returns:
         list: Список словарей с информацией о сохраненных базах данных
     """
-    import os
-    import json
-    
-    saved_dbs = []
-    
     # Проверяем существование директории
-    if not os.path.exists(DB_PATH):
+    try:
+        mtime_key = os.stat(DB_PATH).st_mtime_ns
+    except FileNotFoundError:
         logger.warning(f"Директория базы данных не найдена: {DB_PATH}")
-        return saved_dbs
+        return []
     
-    # Ищем все коллекции (папки, начинающиеся с "video_")
-    for item in os.listdir(DB_PATH):
-        collection_path = os.path.join(DB_PATH, item)
-        
-        # Проверяем, что это директория и начинается с "video_"
-        if os.path.isdir(collection_path) and item.startswith("video_"):
-            video_id = item[6:]  # Убираем префикс "video_"
-            
-            # Пытаемся загрузить метаданные, если они существуют
-            metadata_path = os.path.join(collection_path, "metadata.json")
-            metadata = {}
+    return list(_scan_saved_databases(mtime_key))
+
+
+def _read_cached_metadata(metadata_path):
+    """Читает metadata.json, повторно разбирая JSON только после изменения файла
+    
+    Returns:
+        dict: Метаданные или пустой словарь, если файла нет или он поврежден
+    """
+    try:
+        mtime_ns = os.stat(metadata_path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    
+    cached = _METADATA_CACHE.get(metadata_path)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+    
+    try:
+        metadata = _read_json(metadata_path)
+    except Exception as e:
+        logger.warning(f"Не удалось загрузить метаданные {metadata_path}: {e}")
+        return {}
+    
+    _METADATA_CACHE[metadata_path] = (mtime_ns, metadata)
+    return metadata
+
+
+@functools.lru_cache(maxsize=1)
+def _scan_saved_databases(mtime_key):
+    """Обходит DB_PATH и читает метаданные коллекций (mtime_key — ключ кэша)"""
+    saved_dbs = []
+    
+    # Ищем все коллекции (папки, начинающиеся с "video_"); scandir отдает тип
+    # записи без отдельного stat на каждую
+    with os.scandir(DB_PATH) as entries:
+        for entry in entries:
+            if not entry.name.startswith("video_") or not entry.is_dir():
+                continue
             
-            if os.path.exists(metadata_path):
-                try:
-                    with open(metadata_path, 'r', encoding='utf-8') as f:
-                        metadata = json.load(f)
-                except Exception as e:
-                    logger.warning(f"Не удалось загрузить метаданные для {item}: {e}")
+            video_id = entry.name[6:]  # Убираем префикс "video_"
+            metadata = _read_cached_metadata(os.path.join(entry.path, "metadata.json"))
             
             # Получаем заголовок и дату создания
             title = metadata.get("title", "Неизвестное видео")
             created_at = metadata.get("created_at", "Неизвестная дата")
             
             saved_dbs.append({
-                "collection_name": item,
+                "collection_name": entry.name,
                 "video_id": video_id,
                 "title": title,
                 "created_at": created_at
             })
     
     # Сортируем по дате создания (последние сверху)
-    saved_dbs.sort(key=lambda x: x.get("created_at", ""), reverse=True)
+    saved_dbs.sort(key=itemgetter("created_at"), reverse=True)
     
     return saved_dbs
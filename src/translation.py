@@ -1,9 +1,34 @@
+import os
 import numpy as np
 import logging
+import functools
+import threading
+from collections import OrderedDict
 from typing import List, Dict
 from tqdm.notebook import tqdm
 from src.config import logger
 from src import app_state
+from src.processing import detect_device
+from src.utils import format_times_batch
+
+# Subtitles are translated in batches of similar token length
+TRANSLATION_BATCH_SIZE = 32
+
+# Sentence used to check half-precision models after loading
+_REFERENCE_TEXT = "This lecture explains the main idea in a few simple steps."
+
+# On CPU, long subtitle lists are split across worker processes
+PARALLEL_TRANSLATION_MIN_TEXTS = 256
+MAX_TRANSLATION_WORKERS = 4
+
+# Worker pools stay alive between requests, one per model; two cover a
+# pivot translation (source -> en -> target)
+MAX_TRANSLATION_POOLS = 2
+_translation_pools = OrderedDict()
+_translation_pools_lock = threading.Lock()
+
+# Translation model of a worker process, loaded by _init_translation_worker
+_worker_translator = None
 
 
 def get_available_translation_languages():
@@ -23,6 +48,210 @@ def get_available_translation_languages():
         {"code": "ja", "name": "Japanese"}
     ]
 
+@functools.lru_cache(maxsize=32)
+def _translation_model_exists(model_name: str) -> bool:
+    """Check that a translation model exists without loading its weights
+    
+    Only the model config is fetched (or read from the local cache).
+    """
+    from transformers import AutoConfig
+    
+    try:
+        AutoConfig.from_pretrained(model_name)
+        return True
+    except OSError:
+        return False
+
+
+@functools.lru_cache(maxsize=8)
+def _load_translator(model_name: str):
+    """Load a translation model and its fast tokenizer on the best available device
+    
+    Models are cached per name, so translating another video or switching
+    back to a previous language does not load the weights again.
+    
+    On CUDA and MPS the weights are loaded in float16, which halves memory
+    traffic during generate; a reference sentence is translated to make
+    sure the half-precision model does not produce empty output, otherwise
+    it is reloaded in float32. CPU keeps float32.
+    
+    Returns:
+        (tokenizer, model) pair
+    """
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+    
+    device = detect_device()
+    tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+    
+    if device in ("cuda", "mps"):
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_name, torch_dtype=torch.float16).to(device).eval()
+        try:
+            if _generate_translations([_REFERENCE_TEXT], tokenizer, model)[0].strip():
+                return tokenizer, model
+            logger.warning(f"float16 {model_name} produced empty output, using float32")
+        except Exception as e:
+            logger.warning(f"float16 {model_name} failed, using float32: {e}")
+    
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_name).to(device).eval()
+    return tokenizer, model
+
+
+def _generate_translations(texts: List[str], tokenizer, model) -> List[str]:
+    """Translate one batch, padding only to its longest text"""
+    import torch
+    
+    inputs = tokenizer(
+        texts,
+        return_tensors="pt",
+        padding=True,
+        truncation=True,
+        max_length=512,
+        pad_to_multiple_of=8
+    ).to(model.device)
+    with torch.inference_mode():
+        outputs = model.generate(
+            **inputs,
+            num_beams=1,
+            max_new_tokens=inputs["input_ids"].shape[1] + 16
+        )
+    return tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+
+def _translate_texts(texts: List[str], tokenizer, model, batch_size: int = TRANSLATION_BATCH_SIZE,
+                     desc: str = "Translating subtitles") -> List[str]:
+    """Translate texts in batches of similar length
+    
+    Texts are sorted by token count so every batch pads to a similar length;
+    the translations are returned in the original order.
+    
+    Args:
+        texts: Texts to translate
+        tokenizer: Tokenizer of the translation model
+        model: Seq2seq translation model
+        batch_size: Number of texts per generate call
+        desc: Progress bar label
+        
+    Returns:
+        Translated texts
+    """
+    lengths = [len(ids) for ids in tokenizer(texts, truncation=True, max_length=512)["input_ids"]]
+    order = np.argsort(lengths, kind="stable")
+    
+    translations = [None] * len(texts)
+    for start in tqdm(range(0, len(order), batch_size), desc=desc):
+        indices = order[start:start + batch_size]
+        batch_texts = [texts[i] for i in indices]
+        
+        try:
+            batch_translations = _generate_translations(batch_texts, tokenizer, model)
+        except Exception as e:
+            logger.error(f"Batch translation error: {e}")
+            # If batch fails, try one by one
+            batch_translations = []
+            for text in batch_texts:
+                try:
+                    batch_translations.extend(_generate_translations([text], tokenizer, model))
+                except Exception as inner_e:
+                    logger.error(f"Individual translation error: {inner_e}")
+                    batch_translations.append("[Translation error]")
+        
+        for i, translated_text in zip(indices, batch_translations):
+            translations[i] = translated_text
+    
+    return translations
+
+
+def _init_translation_worker(model_name: str, num_workers: int):
+    """Load the model in a worker process and give it its share of the CPU cores"""
+    global _worker_translator
+    import torch
+    
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // num_workers))
+    _worker_translator = _load_translator(model_name)
+
+
+def _translate_shard(texts: List[str]) -> List[str]:
+    """Translate one shard of texts in a worker process"""
+    tokenizer, model = _worker_translator
+    return _translate_texts(texts, tokenizer, model)
+
+
+def _translation_workers(num_texts: int) -> int:
+    """Number of worker processes to use for translating `num_texts` texts"""
+    # Intra-op parallelism of a single model stops scaling after a few
+    # threads, so long CPU jobs run several models side by side instead
+    if num_texts < PARALLEL_TRANSLATION_MIN_TEXTS or detect_device() != "cpu":
+        return 1
+    return max(1, min(MAX_TRANSLATION_WORKERS, (os.cpu_count() or 1) // 2))
+
+
+def _translation_pool(model_name: str, num_workers: int):
+    """Return the worker pool of a model, creating it on first use
+    
+    Spawning workers and loading the model in each of them costs seconds,
+    so pools are kept for later requests; the least recently used one is
+    shut down when more than MAX_TRANSLATION_POOLS models are in use.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    
+    with _translation_pools_lock:
+        pool = _translation_pools.get(model_name)
+        if pool is None:
+            # Workers are spawned rather than forked: the parent already runs torch threads
+            pool = ProcessPoolExecutor(
+                max_workers=num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_translation_worker,
+                initargs=(model_name, num_workers)
+            )
+            _translation_pools[model_name] = pool
+            while len(_translation_pools) > MAX_TRANSLATION_POOLS:
+                _, old_pool = _translation_pools.popitem(last=False)
+                old_pool.shutdown(wait=False)
+        _translation_pools.move_to_end(model_name)
+        return pool
+
+
+def _discard_translation_pool(model_name: str) -> None:
+    """Shut down a model's pool after a failure, so the next request starts a new one"""
+    with _translation_pools_lock:
+        pool = _translation_pools.pop(model_name, None)
+    if pool is not None:
+        pool.shutdown(wait=False)
+
+
+def _translate_in_processes(texts: List[str], model_name: str, num_workers: int) -> List[str]:
+    """Translate contiguous shards of texts in the model's worker processes"""
+    shard_size = -(-len(texts) // num_workers)
+    shards = [texts[start:start + shard_size] for start in range(0, len(texts), shard_size)]
+    
+    executor = _translation_pool(model_name, num_workers)
+    try:
+        translations = []
+        for shard_translations in executor.map(_translate_shard, shards):
+            translations.extend(shard_translations)
+    except Exception:
+        _discard_translation_pool(model_name)
+        raise
+    return translations
+
+
+def _translate_all(texts: List[str], model_name: str, desc: str = "Translating subtitles") -> List[str]:
+    """Translate texts with the named model in length-sorted batches"""
+    num_workers = _translation_workers(len(texts))
+    if num_workers > 1:
+        try:
+            logger.info(f"Translating {len(texts)} texts with {num_workers} worker processes")
+            return _translate_in_processes(texts, model_name, num_workers)
+        except Exception as e:
+            logger.warning(f"Parallel translation failed, translating in this process: {e}")
+    
+    tokenizer, model = _load_translator(model_name)
+    return _translate_texts(texts, tokenizer, model, desc=desc)
+
+
 def translate_subtitles(subtitles: List[Dict], source_lang: str, target_lang: str) -> List[Dict]:
     """Translate subtitles to target language
     
@@ -49,100 +278,28 @@ def translate_subtitles(subtitles: List[Dict], source_lang: str, target_lang: st
         ]
     
     try:
-        from transformers import pipeline
+        # Repeated lines ("Okay.", "[MUSIC]") are translated once
+        originals = list(dict.fromkeys(subtitle.get("text", "") for subtitle in subtitles))
+        pivot_texts = originals
         
-        # Select appropriate model based on language pair
-        if source_lang == "en" and target_lang == "ru":
-            model_name = "Helsinki-NLP/opus-mt-en-ru"
-        elif source_lang == "ru" and target_lang == "en":
-            model_name = "Helsinki-NLP/opus-mt-ru-en"
-        elif source_lang == "en" and target_lang == "es":
-            model_name = "Helsinki-NLP/opus-mt-en-es"
-        elif source_lang == "es" and target_lang == "en":
-            model_name = "Helsinki-NLP/opus-mt-es-en"
-        elif source_lang == "en" and target_lang == "fr":
-            model_name = "Helsinki-NLP/opus-mt-en-fr"
-        elif source_lang == "fr" and target_lang == "en":
-            model_name = "Helsinki-NLP/opus-mt-fr-en"
-        elif source_lang == "en" and target_lang == "de":
-            model_name = "Helsinki-NLP/opus-mt-en-de"
-        elif source_lang == "de" and target_lang == "en":
-            model_name = "Helsinki-NLP/opus-mt-de-en"
-        elif source_lang == "en" and target_lang == "zh":
-            model_name = "Helsinki-NLP/opus-mt-en-zh"
-        elif source_lang == "zh" and target_lang == "en":
-            model_name = "Helsinki-NLP/opus-mt-zh-en"
-        else:
+        model_name = f"Helsinki-NLP/opus-mt-{source_lang}-{target_lang}"
+        if not _translation_model_exists(model_name):
             # For other language pairs, try to use English as a pivot
             logger.info(f"Direct translation from {source_lang} to {target_lang} not available. Using English as pivot.")
             # First translate to English if source is not English
             if source_lang != "en":
-                interim_model = f"Helsinki-NLP/opus-mt-{source_lang}-en"
-                interim_translator = pipeline("translation", model=interim_model)
-                
-                interim_subtitles = []
-                for subtitle in tqdm(subtitles, desc="Translating to English"):
-                    text = subtitle.get("text", "")
-                    try:
-                        translation = interim_translator(text, max_length=512)
-                        english_text = translation[0].get("translation_text", "")
-                        interim_subtitles.append({
-                            **subtitle,
-                            "text": english_text
-                        })
-                    except Exception as e:
-                        logger.warning(f"Error translating to English: {e}")
-                        interim_subtitles.append(subtitle)
-                
-                # Now set up for English to target
-                subtitles = interim_subtitles
-                source_lang = "en"
-            
+                pivot_texts = _translate_all(originals, f"Helsinki-NLP/opus-mt-{source_lang}-en", desc="Translating to English")
             model_name = f"Helsinki-NLP/opus-mt-en-{target_lang}"
         
         logger.info(f"Using translation model: {model_name}")
-        translator = pipeline("translation", model=model_name)
-        
-        # Translate in batches to avoid memory issues
-        batch_size = 8
-        translated_subtitles = []
-        
-        for i in tqdm(range(0, len(subtitles), batch_size), desc="Translating subtitles"):
-            batch = subtitles[i:i+batch_size]
-            batch_texts = [subtitle.get("text", "") for subtitle in batch]
-            
-            try:
-                # Translate batch
-                translations = translator(batch_texts, max_length=512)
-                
-                # Combine original and translated text
-                for j, translation in enumerate(translations):
-                    subtitle = batch[j]
-                    translated_text = translation.get("translation_text", "")
-                    translated_subtitles.append({
-                        **subtitle,
-                        "translated_text": translated_text
-                    })
-            except Exception as e:
-                logger.error(f"Batch translation error: {e}")
-                # If batch fails, try one by one
-                for subtitle in batch:
-                    try:
-                        text = subtitle.get("text", "")
-                        translation = translator(text, max_length=512)
-                        translated_text = translation[0].get("translation_text", "")
-                        translated_subtitles.append({
-                            **subtitle,
-                            "translated_text": translated_text
-                        })
-                    except Exception as inner_e:
-                        logger.error(f"Individual translation error: {inner_e}")
-                        translated_subtitles.append({
-                            **subtitle,
-                            "translated_text": f"[Translation error]"
-                        })
+        # Translations are keyed by the original lines, not the English pivot
+        translations = dict(zip(originals, _translate_all(pivot_texts, model_name)))
         
-        return translated_subtitles
+        # Combine original and translated text
+        return [
+            {**subtitle, "translated_text": translations[subtitle.get("text", "")]}
+            for subtitle in subtitles
+        ]
     
     except Exception as e:
         logger.error(f"Translation error: {e}")
@@ -161,7 +318,7 @@ def translate_subtitle_text(target_language: str):
     Returns:
         Markdown formatted translated subtitles
     """
-    if not hasattr(app_state, 'subtitles') or not app_state.subtitles:
+    if not app_state.subtitles:
         return "No subtitles loaded. Please process a video first."
     
     # Convert dropdown dictionary to string if needed
@@ -178,19 +335,35 @@ def translate_subtitle_text(target_language: str):
         )
         
         # Format translated subtitles
-        result = ""
-        for entry in translated:
-            start_seconds = entry.get('start', 0)
-            minutes, seconds = divmod(int(start_seconds), 60)
-            hours, minutes = divmod(minutes, 60)
-            
-            timestamp = f"[{hours:02d}:{minutes:02d}:{seconds:02d}]"
-            original = entry.get('text', '')
-            translated = entry.get('translated_text', '')
-            
-            result += f"{timestamp}\n**Original:** {original}\n**Translated:** {translated}\n\n"
-        
-        return result
+        time_strs = format_times_batch([entry.get('start', 0) for entry in translated])
+        return "".join(
+            f"[{time_str}]\n**Original:** {entry.get('text', '')}\n**Translated:** {entry.get('translated_text', '')}\n\n"
+            for entry, time_str in zip(translated, time_strs)
+        )
     except Exception as e:
         logger.error(f"Translation error: {e}")
         return f"Error translating subtitles: {str(e)}"
+
+
+def translate_subtitle_texts(target_languages: List[str]):
+    """Batched variant of translate_subtitle_text for Gradio `batch=True` events
+    
+    Requests received together are translated once per distinct target language.
+    
+    Args:
+        target_languages: Target language codes, one per request
+        
+    Returns:
+        A list with one output list: Markdown formatted translated subtitles per request
+    """
+    languages = [
+        language.get("value", "en") if isinstance(language, dict) else language
+        for language in target_languages
+    ]
+    
+    translations = {}
+    for language in languages:
+        if language not in translations:
+            translations[language] = translate_subtitle_text(language)
+    
+    return [[translations[language] for language in languages]]
@@ -1,3 +1,5 @@
+import functools
+import numpy as np
 from IPython.display import display, HTML
 
 
@@ -16,6 +18,11 @@ def display_info(title, message, type="info"):
     """))
 
 
+# Двузначные строки "00".."99" для сборки HH:MM:SS без форматирования чисел
+_TWO_DIGIT = [f"{i:02d}" for i in range(100)]
+
+
+@functools.lru_cache(maxsize=4096)
 def format_time(seconds):
     """
     Форматирует время в секундах в формат HH:MM:SS
@@ -26,6 +33,32 @@ def format_time(seconds):
     Returns:
         Строка в формате HH:MM:SS
     """
-    minutes, seconds = divmod(int(seconds), 60)
-    hours, minutes = divmod(minutes, 60)
-    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
\ No newline at end of file
+    seconds = int(seconds)
+    hours = seconds // 3600
+    if not 0 <= hours < 100:
+        # Отрицательные и трехзначные часы форматируются как раньше, без таблицы
+        return f"{hours:02d}:{_TWO_DIGIT[seconds // 60 % 60]}:{_TWO_DIGIT[seconds % 60]}"
+    return f"{_TWO_DIGIT[hours]}:{_TWO_DIGIT[seconds // 60 % 60]}:{_TWO_DIGIT[seconds % 60]}"
+
+
+def format_times_batch(seconds):
+    """
+    Форматирует массив времен в секундах в строки HH:MM:SS
+    
+    Часы, минуты и секунды вычисляются векторно для всего массива сразу.
+    
+    Args:
+        seconds: Последовательность времен в секундах
+        
+    Returns:
+        Список строк в формате HH:MM:SS
+    """
+    seconds = np.asarray(seconds, dtype=np.float64).astype(np.int64)
+    hours = (seconds // 3600).tolist()
+    minutes = (seconds // 60 % 60).tolist()
+    secs = (seconds % 60).tolist()
+    two_digit = _TWO_DIGIT
+    return [
+        f"{two_digit[h] if 0 <= h < 100 else f'{h:02d}'}:{two_digit[m]}:{two_digit[s]}"
+        for h, m, s in zip(hours, minutes, secs)
+    ]
@@ -1,36 +1,354 @@
 import os
 import re
 import json
+import time
+import sqlite3
 import logging
-import requests
+import threading
+import functools
+import email.utils
+import httpx
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
 from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
-from bs4 import BeautifulSoup
-from src.config import logger
+from src.config import logger, DB_PATH
+from src.utils import format_times_batch
 
+# orjson разбирает JSON в несколько раз быстрее и принимает байты напрямую
+try:
+    import orjson
+    _loads_json = orjson.loads
+except ImportError:
+    _loads_json = json.loads
 
+
+# Кэш глав видео: (источник, video_id) -> (время получения, список глав)
+_CHAPTERS_CACHE = {}
+_CHAPTERS_CACHE_TTL = 3600  # Время жизни записи кэша в секундах
+
+# Время жизни записей дискового кэша ответов YouTube по умолчанию (сутки)
+_DISK_CACHE_TTL = 86400
+_NO_CHAPTERS_CACHE_TTL = 7 * 86400  # Для видео без глав (неделя)
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+# Максимальное число ID в одном запросе videos.list YouTube Data API
+_VIDEOS_LIST_MAX_IDS = 50
+
+# ID видео в стандартных, встроенных (embed/), watch?v= и коротких (youtu.be/) ссылках
+_VIDEO_ID_RE = re.compile(r'(?:v=|/|embed/|watch\?v=|youtu\.be/)([0-9A-Za-z_-]{11})')
+
+# Более длинные строки не считаются ссылками на видео
+_MAX_URL_LENGTH = 2048
+
+# Символы, из которых состоит ID видео
+_VIDEO_ID_CHARS = frozenset("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz_-")
+
+# Временные метки глав в описании (например, "00:30 Заголовок" или "1:45:30 Заголовок")
+_DESCRIPTION_TIMESTAMP_RE = re.compile(
+    r'((?:\d{1,2}:)?\d{1,2}:\d{2})\s+(.*?)(?=\n(?:\d{1,2}:)?\d{1,2}:\d{2}|\n\n|$)', re.MULTILINE
+)
+
+# Временная метка M:SS или H:MM:SS
+_TIME_RE = re.compile(r'(?:(?P<hours>\d+):)?(?P<minutes>\d+):(?P<seconds>\d+)')
+
+# Начало и конец блока ytInitialData в потоке страницы
+_INITIAL_DATA_MARKER = b'ytInitialData'
+_INITIAL_DATA_END = b'};</script>'
+
+# JSON с данными страницы видео (в том числе главами) в HTML страницы
+_YT_INITIAL_DATA_RE = re.compile(rb'ytInitialData\s*=\s*(\{.+?\});\s*</script>', re.DOTALL)
+
+
+class DiskTTLCache:
+    """Персистентный кэш JSON-значений с временем жизни на SQLite
+    
+    Переживает перезапуск приложения, поэтому повторная обработка видео
+    не делает повторных запросов за редко меняющимися данными.
+    """
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(DB_PATH, "_youtube_cache.sqlite3")
+        self._conn = None
+        self._lock = threading.Lock()
+    
+    def _connect(self):
+        # Вызывается под блокировкой; база открывается при первом обращении
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value TEXT NOT NULL)"
+            )
+        return self._conn
+    
+    def get(self, key):
+        """Возвращает значение по ключу или None, если его нет или оно устарело"""
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    "SELECT value FROM entries WHERE key = ? AND expires_at > ?", (key, time.time())
+                ).fetchone()
+        except Exception as e:
+            logger.warning(f"YouTube cache read failed: {e}")
+            return None
+        return _loads_json(row[0]) if row else None
+    
+    def set(self, key, value, ttl: float = _DISK_CACHE_TTL):
+        """Сохраняет значение на ttl секунд"""
+        try:
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO entries (key, expires_at, value) VALUES (?, ?, ?)",
+                        (key, time.time() + ttl, json.dumps(value, ensure_ascii=False))
+                    )
+        except Exception as e:
+            logger.warning(f"YouTube cache write failed: {e}")
+
+
+def _create_http_client():
+    """
+    Создает общий HTTP-клиент для запросов к YouTube
+    
+    Клиент держит пул постоянных соединений (TLS-рукопожатие не повторяется
+    на каждый запрос), по HTTP/2 мультиплексирует параллельные запросы в
+    одном соединении и запрашивает сжатые ответы: страница видео в gzip
+    в несколько раз меньше.
+    """
+    # HTTP/2 требует необязательный пакет h2, brotli декодируется только с пакетом brotli
+    try:
+        import h2  # noqa: F401
+        http2 = True
+    except ImportError:
+        http2 = False
+    
+    encodings = "gzip, deflate"
+    try:
+        import brotli  # noqa: F401
+        encodings += ", br"
+    except ImportError:
+        pass
+    
+    return httpx.Client(
+        http2=http2,
+        timeout=10,
+        follow_redirects=True,
+        headers={"Accept-Encoding": encodings},
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+    )
+
+
+# Общий потокобезопасный HTTP-клиент для всех запросов модуля
+_HTTP_CLIENT = _create_http_client()
+
+
+# Общий дисковый кэш ответов oEmbed и глав
+_YOUTUBE_CACHE = DiskTTLCache()
+
+
+def _cache_ttl(headers, default: float = _DISK_CACHE_TTL) -> float:
+    """
+    Время жизни записи по заголовкам ответа: Cache-Control max-age, затем Expires
+    
+    Returns:
+        float: Время жизни в секундах (default, если сервер его не указал)
+    """
+    match = _MAX_AGE_RE.search(headers.get("Cache-Control") or "")
+    if match and int(match.group(1)) > 0:
+        return int(match.group(1))
+    
+    expires = headers.get("Expires")
+    if expires:
+        try:
+            ttl = email.utils.parsedate_to_datetime(expires).timestamp() - time.time()
+            if ttl > 0:
+                return ttl
+        except (TypeError, ValueError):
+            pass
+    
+    return default
+
+
+def _peek_cached_chapters(source, video_id):
+    """
+    Возвращает главы из памяти или дискового кэша, не делая запросов
+    
+    Returns:
+        list: Закэшированные главы или None, если их нет в кэше
+    """
+    key = (source, video_id)
+    cached = _CHAPTERS_CACHE.get(key)
+    if cached and time.monotonic() - cached[0] < _CHAPTERS_CACHE_TTL:
+        return cached[1]
+    
+    # Затем дисковый кэш, переживающий перезапуск приложения
+    chapters = _YOUTUBE_CACHE.get(f"chapters:{source}:{video_id}")
+    if chapters is not None:
+        _CHAPTERS_CACHE[key] = (time.monotonic(), chapters)
+    return chapters
+
+
+def _store_chapters(source, video_id, chapters):
+    """
+    Сохраняет главы в память и в дисковый кэш
+    
+    Отсутствие глав тоже кэшируется, причем дольше: у большинства видео
+    глав нет и не появляется, и повторная обработка такого видео не
+    должна снова опрашивать ни страницу, ни API.
+    """
+    ttl = _DISK_CACHE_TTL if chapters else _NO_CHAPTERS_CACHE_TTL
+    _YOUTUBE_CACHE.set(f"chapters:{source}:{video_id}", chapters, ttl)
+    _CHAPTERS_CACHE[(source, video_id)] = (time.monotonic(), chapters)
+
+
+def _get_cached_chapters(source, video_id, fetch):
+    """
+    Возвращает главы из кэша или получает их через fetch и сохраняет в кэш
+    
+    Args:
+        source: Название источника глав ('html' или 'api')
+        video_id: ID видео YouTube
+        fetch: Функция без аргументов, возвращающая список глав или None при ошибке
+        
+    Returns:
+        list: Копия списка глав (вызывающий код может изменять главы)
+    """
+    chapters = _peek_cached_chapters(source, video_id)
+    if chapters is None:
+        chapters = fetch()
+        if chapters is None:
+            # Ошибки не кэшируем, чтобы повторить запрос в следующий раз
+            return []
+        _store_chapters(source, video_id, chapters)
+    
+    return [dict(chapter) for chapter in chapters]
+
+
+@functools.lru_cache(maxsize=4096)
 def extract_video_id(youtube_url: str) -> Optional[str]:
     """Extract video ID from YouTube URL
     
+    A bare 11-character video ID is accepted as is; strings that are not
+    YouTube links are rejected without running the regex.
+    
     Args:
-        youtube_url: URL of the YouTube video
+        youtube_url: URL of the YouTube video or video ID
         
     Returns:
         Video ID or None if not found
     """
-    patterns = [
-        r'(?:v=|\/)([0-9A-Za-z_-]{11}).*',  # Standard YouTube URLs
-        r'(?:embed\/)([0-9A-Za-z_-]{11})',  # Embedded URLs
-        r'(?:watch\?v=)([0-9A-Za-z_-]{11})',  # Watch URLs
-        r'(?:youtu\.be\/)([0-9A-Za-z_-]{11})'  # Shortened youtu.be URLs
-    ]
+    # Overlong input is rejected before any regex runs on it
+    if len(youtube_url) > _MAX_URL_LENGTH:
+        return None
     
-    for pattern in patterns:
-        match = re.search(pattern, youtube_url)
-        if match:
-            return match.group(1)
+    if len(youtube_url) == 11 and _VIDEO_ID_CHARS.issuperset(youtube_url):
+        return youtube_url
+    
+    # youtube.com, youtu.be and youtube-nocookie.com links all contain "youtu"
+    if 'youtu' not in youtube_url:
+        return None
+    
+    match = _VIDEO_ID_RE.search(youtube_url)
+    return match.group(1) if match else None
+
+
+def _fetch_video_metadata(video_id):
+    """Get the video title, author and thumbnail from oEmbed
+    
+    Returns:
+        dict: Metadata fields for video_info (placeholders if the request fails)
+    """
+    try:
+        # oEmbed data (title, author, thumbnail) practically never changes
+        cache_key = f"oembed:{video_id}"
+        data = _YOUTUBE_CACHE.get(cache_key)
+        if data is None:
+            oembed_url = f"https://www.youtube.com/oembed?url=https://www.youtube.com/watch?v={video_id}&format=json"
+            response = _HTTP_CLIENT.get(oembed_url)
+            response.raise_for_status()
+            data = _loads_json(response.content)
+            _YOUTUBE_CACHE.set(cache_key, data, _cache_ttl(response.headers))
+        
+        return {
+            "title": data.get("title", "Unknown"),
+            "author": data.get("author_name", "Unknown"),
+            "thumbnail": data.get("thumbnail_url", "")
+        }
+    except Exception as e:
+        logger.warning(f"Could not get video metadata: {e}")
+        return {
+            "title": "Unknown title",
+            "author": "Unknown author",
+            "thumbnail": ""
+        }
+
+
+def _fetch_video_chapters(video_id):
+    """Get chapters from the watch page, falling back to the YouTube Data API"""
+    chapters = get_youtube_chapters(video_id)
+    
+    # If chapters not found through parsing, try through API
+    if not chapters:
+        chapters = get_youtube_video_chapters_api(video_id)
+    
+    return chapters
+
+
+def _list_transcripts(video_id):
+    """List the available transcripts with the API of the installed youtube-transcript-api
+    
+    Versions >= 1.0 have the instance method `list`; the class method
+    `list_transcripts` of 0.6.x is deprecated there and removed in 1.2.
+    """
+    if hasattr(YouTubeTranscriptApi, "list"):
+        return YouTubeTranscriptApi().list(video_id)
+    return YouTubeTranscriptApi.list_transcripts(video_id)
+
+
+def _fetch_transcript(video_id, languages):
+    """Get the transcript in the first available preferred language, or in any language
+    
+    The list of available transcripts is requested once and the language is
+    chosen from it, instead of one request per preferred language.
+    
+    Returns:
+        tuple: (subtitles as a list of {"text", "start", "duration"} dicts, language fields for video_info)
+        
+    Raises:
+        NoTranscriptFound: If the video has no transcripts
+        TranscriptsDisabled: If subtitles are disabled for the video
+    """
+    try:
+        transcript_list = _list_transcripts(video_id)
+        
+        try:
+            # Preferred languages in order; a manual transcript wins over a
+            # generated one in the same language
+            transcript = transcript_list.find_transcript(languages)
+        except NoTranscriptFound:
+            # If no transcript is found in preferred languages, get any available one
+            available = list(transcript_list)
+            if not available:
+                raise
+            transcript = min(available, key=lambda t: t.is_generated)
+        
+        transcripts = transcript.fetch()
+    except Exception as e:
+        logger.error(f"Could not find any subtitles: {e}")
+        raise
+    
+    # Versions >= 1.0 return a FetchedTranscript of snippet objects
+    if hasattr(transcripts, "to_raw_data"):
+        transcripts = transcripts.to_raw_data()
+    
+    logger.info(f"Found subtitles in {transcript.language_code}")
     
-    return None
+    return transcripts, {
+        "language": transcript.language_code,
+        "language_code": transcript.language_code,
+        "is_generated": transcript.is_generated
+    }
 
 
 # Обновление функции get_youtube_subtitles для получения информации о главах
@@ -67,83 +385,29 @@ def get_youtube_subtitles(youtube_url, languages=['en']):
     }
     
     try:
-        # Get video metadata (title, etc.)
-        try:
-            import urllib.request
+        # Metadata, chapters and transcript are independent network calls:
+        # run them in parallel so the total wait is the slowest one, not the sum
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            metadata_future = executor.submit(_fetch_video_metadata, video_id)
+            chapters_future = executor.submit(_fetch_video_chapters, video_id)
+            transcript_future = executor.submit(_fetch_transcript, video_id, languages)
             
-            oembed_url = f"https://www.youtube.com/oembed?url=https://www.youtube.com/watch?v={video_id}&format=json"
-            response = urllib.request.urlopen(oembed_url)
-            data = json.loads(response.read())
+            video_info.update(metadata_future.result())
             
-            video_info.update({
-                "title": data.get("title", "Unknown"),
-                "author": data.get("author_name", "Unknown"),
-                "thumbnail": data.get("thumbnail_url", "")
-            })
-        except Exception as e:
-            logger.warning(f"Could not get video metadata: {e}")
-            video_info.update({
-                "title": "Unknown title",
-                "author": "Unknown author",
-                "thumbnail": ""
-            })
-        
-        # Try to get chapters information
-        chapters = get_youtube_chapters(video_id)
-        
-        # If chapters not found through parsing, try through API
-        if not chapters:
-            chapters = get_youtube_video_chapters_api(video_id)
-        
-        if chapters:
-            video_info["chapters"] = chapters
-            video_info["has_chapters"] = True
-            logger.info(f"Found {len(chapters)} chapters for video {video_id}")
-        
-        # Try to get transcript in any of the preferred languages
-        available_transcripts = []
-        
-        # First try to get manually created transcripts in the preferred languages
-        for language in languages:
-            try:
-                # This will raise an exception if no transcript is found
-                transcripts = YouTubeTranscriptApi.get_transcript(video_id, languages=[language])
-                
-                # If we get here, transcript was found
-                video_info["language"] = language
-                video_info["language_code"] = language
-                video_info["is_generated"] = False  # We don't know, but assume not generated
-                
-                logger.info(f"Found subtitles in {language}")
-                
-                return {
-                    "success": True,
-                    "subtitles": transcripts,
-                    "video_info": video_info
-                }
-            except Exception as e:
-                logger.debug(f"No transcript in {language}: {e}")
-                continue
-        
-        # If no transcript is found in preferred languages, get any available one
-        try:
-            # Just try to get any transcript available
-            transcripts = YouTubeTranscriptApi.get_transcript(video_id)
+            chapters = chapters_future.result()
+            if chapters:
+                video_info["chapters"] = chapters
+                video_info["has_chapters"] = True
+                logger.info(f"Found {len(chapters)} chapters for video {video_id}")
             
-            # If we get here, transcript was found
-            video_info["language"] = "Unknown"  # We don't know which language was selected
-            video_info["language_code"] = "unknown"
-            
-            logger.info(f"Found subtitles (language unknown)")
-            
-            return {
-                "success": True,
-                "subtitles": transcripts,
-                "video_info": video_info
-            }
-        except Exception as e:
-            logger.error(f"Could not find any subtitles: {e}")
-            raise NoTranscriptFound("No transcripts available for this video")
+            transcripts, language_info = transcript_future.result()
+        
+        video_info.update(language_info)
+        return {
+            "success": True,
+            "subtitles": transcripts,
+            "video_info": video_info
+        }
             
     except Exception as e:
         logger.error(f"Error extracting subtitles: {str(e)}")
@@ -155,6 +419,34 @@ def get_youtube_subtitles(youtube_url, languages=['en']):
         }
 
 
+def get_youtube_subtitles_batch(youtube_urls, languages=['en'], max_workers=8):
+    """
+    Get subtitles for several YouTube videos (e.g. a playlist)
+    
+    Description chapters of all videos are requested from the YouTube Data
+    API up front, 50 videos per request, so the per-video fallback is
+    served from the cache. Videos are then processed in parallel threads
+    that share the HTTP connection pool and the caches.
+    
+    Args:
+        youtube_urls (list): URLs of the YouTube videos
+        languages (list): List of preferred language codes
+        max_workers (int): Maximum number of videos processed at once
+        
+    Returns:
+        list: get_youtube_subtitles result for each URL, in order
+    """
+    video_ids = [video_id for video_id in map(extract_video_id, youtube_urls) if video_id]
+    if video_ids and os.getenv('YOUTUBE_DATA_API_KEY'):
+        get_youtube_video_chapters_api_batch(video_ids)
+    
+    if not youtube_urls:
+        return []
+    
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(youtube_urls))) as executor:
+        return list(executor.map(lambda youtube_url: get_youtube_subtitles(youtube_url, languages), youtube_urls))
+
+
 # Функция для получения информации о главах YouTube видео
 def get_youtube_chapters(video_id):
     """
@@ -166,97 +458,123 @@ def get_youtube_chapters(video_id):
     Returns:
         list: Список глав с временными метками, или пустой список, если главы недоступны
     """
-    import requests
-    import re
-    from bs4 import BeautifulSoup
+    return _get_cached_chapters("html", video_id, lambda: _fetch_youtube_chapters(video_id))
+
+
+def _chapters_from_initial_data(data):
+    """
+    Извлекает главы из ytInitialData страницы видео
     
-    try:
-        # Запрашиваем страницу видео
-        url = f"https://www.youtube.com/watch?v={video_id}"
-        response = requests.get(url)
-        
-        if response.status_code != 200:
-            logger.warning(f"Failed to get video page: HTTP {response.status_code}")
-            return []
+    Args:
+        data: Разобранный JSON ytInitialData
         
-        # Используем BeautifulSoup для парсинга HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
+    Returns:
+        list: Главы в виде {"title", "start_time"} или пустой список
+    """
+    player_bar = (
+        data.get("playerOverlays", {})
+        .get("playerOverlayRenderer", {})
+        .get("decoratedPlayerBarRenderer", {})
+        .get("decoratedPlayerBarRenderer", {})
+        .get("playerBar", {})
+        .get("multiMarkersPlayerBarRenderer", {})
+    )
+    
+    for marker in player_bar.get("markersMap", []):
+        chapters = marker.get("value", {}).get("chapters")
+        if not chapters:
+            continue
         
-        # Ищем скрипты с данными
-        scripts = soup.find_all('script')
         chapters_data = []
+        for chapter in chapters:
+            renderer = chapter.get("chapterRenderer", {})
+            chapters_data.append({
+                "title": renderer.get("title", {}).get("simpleText", ""),
+                "start_time": renderer.get("timeRangeStartMillis", 0) / 1000
+            })
+        return chapters_data
+    
+    return []
+
+
+def _read_until_initial_data(response, chunk_size=64 * 1024):
+    """
+    Читает потоковый ответ страницы видео только до конца ytInitialData
+    
+    Остаток страницы (обычно большая ее часть) не скачивается: соединение
+    закрывается, как только найден конец блока.
+    
+    Returns:
+        bytes: Прочитанное начало страницы (вся страница, если блок не найден)
+    """
+    buffer = bytearray()
+    start = -1
+    for chunk in response.iter_bytes(chunk_size=chunk_size):
+        # Продолжаем поиск с конца уже просмотренных данных (с запасом на длину маркера)
+        search_from = max(0, len(buffer) - len(_INITIAL_DATA_END))
+        buffer += chunk
+        
+        if start < 0:
+            start = buffer.find(_INITIAL_DATA_MARKER, max(0, search_from - len(_INITIAL_DATA_MARKER)))
+            if start < 0:
+                continue
+            search_from = start
         
-        # Поиск информации о главах в скриптах
-        for script in scripts:
-            script_text = script.string
-            if script_text and "chapters" in script_text:
-                # Ищем паттерн с данными о главах
-                chapter_pattern = re.compile(r'\"chapters\":\[(.*?)\]')
-                matches = chapter_pattern.findall(script_text)
-                
-                if matches:
-                    # Парсим данные о главах
-                    import json
-                    try:
-                        # Пытаемся преобразовать в JSON
-                        chapters_json = f"[{matches[0]}]"
-                        chapters_data = json.loads(chapters_json)
-                        logger.info(f"Found {len(chapters_data)} chapters in video {video_id}")
-                        break
-                    except json.JSONDecodeError:
-                        logger.warning(f"Failed to parse chapters JSON: {matches[0]}")
-        
-        if not chapters_data:
-            # Альтернативный метод: поиск в HTML
-            chapter_elements = soup.select('div.ytp-chapter-title-content')
-            if chapter_elements:
-                for element in chapter_elements:
-                    # Парсим заголовок и время
-                    title = element.text.strip()
-                    time_elem = element.find_previous('span', class_='ytp-time-current')
-                    if time_elem and title:
-                        time_str = time_elem.text
-                        # Преобразуем время в секунды
-                        h, m, s = 0, 0, 0
-                        if ':' in time_str:
-                            parts = time_str.split(':')
-                            if len(parts) == 2:
-                                m, s = map(int, parts)
-                            elif len(parts) == 3:
-                                h, m, s = map(int, parts)
-                        
-                        seconds = h * 3600 + m * 60 + s
-                        chapters_data.append({
-                            "title": title,
-                            "start_time": seconds
-                        })
+        if buffer.find(_INITIAL_DATA_END, search_from) >= 0:
+            break
+    
+    return bytes(buffer)
+
+
+def _fetch_youtube_chapters(video_id):
+    """
+    Загружает и разбирает страницу видео для получения глав
+    
+    Args:
+        video_id: ID видео YouTube
         
-        # Преобразуем данные в стандартный формат
-        chapters = []
-        for i, chapter in enumerate(chapters_data):
-            # Получаем время начала текущей главы
-            start_time = chapter.get("start_time") or chapter.get("startTime") or 0
-            
-            # Получаем время окончания (начало следующей главы или конец видео)
-            end_time = None
-            if i < len(chapters_data) - 1:
-                next_chapter = chapters_data[i + 1]
-                end_time = next_chapter.get("start_time") or next_chapter.get("startTime") or None
-            
-            # Получаем заголовок
-            title = chapter.get("title") or chapter.get("chapterName") or f"Chapter {i+1}"
+    Returns:
+        list: Список глав или None, если страницу не удалось получить
+    """
+    try:
+        # Запрашиваем страницу видео
+        url = f"https://www.youtube.com/watch?v={video_id}"
+        with _HTTP_CLIENT.stream("GET", url) as response:
+            if response.status_code != 200:
+                logger.warning(f"Failed to get video page: HTTP {response.status_code}")
+                return None
             
-            chapters.append({
-                "title": title,
-                "start_time": start_time,
-                "end_time": end_time
-            })
+            page = _read_until_initial_data(response)
+        
+        # Главы лежат в JSON ytInitialData, встроенном в страницу: достаем его
+        # регулярным выражением по байтам, без HTML-парсера и декодирования
+        match = _YT_INITIAL_DATA_RE.search(page)
+        chapters_data = []
+        if match:
+            try:
+                chapters_data = _chapters_from_initial_data(_loads_json(match.group(1)))
+                if chapters_data:
+                    logger.info(f"Found {len(chapters_data)} chapters in video {video_id}")
+            except ValueError as e:
+                logger.warning(f"Failed to parse ytInitialData JSON: {e}")
+        
+        # Преобразуем данные в стандартный формат: каждая глава заканчивается
+        # там, где начинается следующая (последняя — в конце видео)
+        starts = [chapter.get("start_time") or chapter.get("startTime") or 0 for chapter in chapters_data]
+        titles = [
+            chapter.get("title") or chapter.get("chapterName") or f"Chapter {i+1}"
+            for i, chapter in enumerate(chapters_data)
+        ]
+        chapters = [
+            {"title": title, "start_time": start_time, "end_time": end_time}
+            for title, start_time, end_time in zip(titles, starts, starts[1:] + [None])
+        ]
         
         return chapters
         
     except Exception as e:
         logger.error(f"Error fetching YouTube chapters: {e}")
-        return []
+        return None
 
 
 # Функция для получения заголовков YouTube с API Data
@@ -279,82 +597,153 @@ def get_youtube_video_chapters_api(video_id, api_key=None):
         logger.warning("No YouTube Data API key provided")
         return []
     
-    try:
-        import requests
+    return _get_cached_chapters("api", video_id, lambda: _fetch_youtube_video_chapters_api(video_id, api_key))
+
+
+def get_youtube_video_chapters_api_batch(video_ids, api_key=None):
+    """
+    Получает главы нескольких видео через YouTube Data API
+    
+    Описания запрашиваются одним запросом videos.list на каждые 50 видео,
+    а не запросом на видео, что экономит квоту API.
+    
+    Args:
+        video_ids: Список ID видео
+        api_key: API ключ YouTube Data API (опционально)
+        
+    Returns:
+        dict: ID видео -> список глав (пустой, если глав нет или запрос не удался)
+    """
+    if not api_key:
+        api_key = os.getenv('YOUTUBE_DATA_API_KEY')
+    
+    if not api_key:
+        logger.warning("No YouTube Data API key provided")
+        return {video_id: [] for video_id in video_ids}
+    
+    chapters_by_id = {}
+    missing = []
+    for video_id in dict.fromkeys(video_ids):
+        cached = _peek_cached_chapters("api", video_id)
+        if cached is None:
+            missing.append(video_id)
+        else:
+            chapters_by_id[video_id] = cached
+    
+    for start in range(0, len(missing), _VIDEOS_LIST_MAX_IDS):
+        batch = missing[start:start + _VIDEOS_LIST_MAX_IDS]
+        descriptions = _fetch_video_descriptions(batch, api_key)
+        for video_id in batch:
+            if descriptions is None:
+                # Ошибки не кэшируем
+                chapters_by_id[video_id] = []
+                continue
+            if video_id not in descriptions:
+                logger.warning(f"No video data found for {video_id}")
+            chapters = _chapters_from_description(descriptions.get(video_id, ""), video_id)
+            _store_chapters("api", video_id, chapters)
+            chapters_by_id[video_id] = chapters
+    
+    return {video_id: [dict(chapter) for chapter in chapters_by_id[video_id]] for video_id in video_ids}
+
+
+def _fetch_youtube_video_chapters_api(video_id, api_key):
+    """
+    Запрашивает описание видео через YouTube Data API и извлекает из него главы
+    
+    Args:
+        video_id: ID видео
+        api_key: API ключ YouTube Data API
         
+    Returns:
+        list: Список глав или None, если запрос к API не удался
+    """
+    descriptions = _fetch_video_descriptions([video_id], api_key)
+    if descriptions is None:
+        return None
+    
+    # Проверяем, есть ли информация о видео
+    if video_id not in descriptions:
+        logger.warning(f"No video data found for {video_id}")
+        return []
+    
+    return _chapters_from_description(descriptions[video_id], video_id)
+
+
+def _fetch_video_descriptions(video_ids, api_key):
+    """
+    Запрашивает описания видео через YouTube Data API (не более 50 ID за запрос)
+    
+    Args:
+        video_ids: Список ID видео
+        api_key: API ключ YouTube Data API
+        
+    Returns:
+        dict: ID видео -> описание или None, если запрос к API не удался
+    """
+    try:
         # Запрашиваем информацию о видео через API
         url = f"https://www.googleapis.com/youtube/v3/videos"
         params = {
-            "part": "snippet,contentDetails",
-            "id": video_id,
+            "part": "snippet",
+            "id": ",".join(video_ids),
             "key": api_key
         }
         
-        response = requests.get(url, params=params)
+        response = _HTTP_CLIENT.get(url, params=params)
         
         if response.status_code != 200:
             logger.warning(f"Failed to get video data: HTTP {response.status_code}")
-            return []
-        
-        data = response.json()
+            return None
         
-        # Проверяем, есть ли информация о видео
-        if "items" not in data or len(data["items"]) == 0:
-            logger.warning(f"No video data found for {video_id}")
-            return []
-        
-        # Получаем описание видео, которое может содержать временные метки
-        description = data["items"][0]["snippet"].get("description", "")
-        
-        # Ищем временные метки в описании
-        import re
+        data = _loads_json(response.content)
         
-        # Паттерн для поиска временных меток (например, "00:30 Заголовок" или "1:45:30 Заголовок")
-        timestamp_pattern = re.compile(r'((?:\d{1,2}:)?\d{1,2}:\d{2})\s+(.*?)(?=\n(?:\d{1,2}:)?\d{1,2}:\d{2}|\n\n|$)', re.MULTILINE)
-        matches = timestamp_pattern.findall(description)
-        
-        if not matches:
-            logger.info(f"No timestamps found in description for {video_id}")
-            return []
-        
-        # Преобразуем временные метки в секунды и создаем список глав
-        chapters = []
-        for i, (time_str, title) in enumerate(matches):
-            # Преобразуем время в секунды
-            h, m, s = 0, 0, 0
-            parts = time_str.split(':')
-            if len(parts) == 2:
-                m, s = map(int, parts)
-            elif len(parts) == 3:
-                h, m, s = map(int, parts)
-            
-            start_time = h * 3600 + m * 60 + s
-            
-            # Определяем время окончания (начало следующей главы или None)
-            end_time = None
-            if i < len(matches) - 1:
-                next_time_str = matches[i + 1][0]
-                next_parts = next_time_str.split(':')
-                next_h, next_m, next_s = 0, 0, 0
-                if len(next_parts) == 2:
-                    next_m, next_s = map(int, next_parts)
-                elif len(next_parts) == 3:
-                    next_h, next_m, next_s = map(int, next_parts)
-                
-                end_time = next_h * 3600 + next_m * 60 + next_s
-            
-            chapters.append({
-                "title": title.strip(),
-                "start_time": start_time,
-                "end_time": end_time
-            })
-        
-        logger.info(f"Found {len(chapters)} chapters in description for {video_id}")
-        return chapters
+        # Получаем описания видео, которые могут содержать временные метки
+        return {
+            item["id"]: item["snippet"].get("description", "")
+            for item in data.get("items", [])
+        }
         
     except Exception as e:
         logger.error(f"Error fetching chapters from YouTube API: {e}")
+        return None
+
+
+def _to_seconds(time_str):
+    """Переводит временную метку вида M:SS или H:MM:SS в секунды"""
+    match = _TIME_RE.fullmatch(time_str)
+    return int(match["hours"] or 0) * 3600 + int(match["minutes"]) * 60 + int(match["seconds"])
+
+
+def _chapters_from_description(description, video_id):
+    """
+    Извлекает главы из временных меток в описании видео
+    
+    Args:
+        description: Описание видео
+        video_id: ID видео (для журнала)
+        
+    Returns:
+        list: Список глав или пустой список
+    """
+    # Ищем временные метки в описании
+    matches = _DESCRIPTION_TIMESTAMP_RE.findall(description)
+    
+    if not matches:
+        logger.info(f"No timestamps found in description for {video_id}")
         return []
+    
+    # Преобразуем временные метки в секунды один раз для всех глав
+    seconds = [_to_seconds(time_str) for time_str, _ in matches]
+    
+    # Время окончания — начало следующей главы или None
+    chapters = [
+        {"title": title.strip(), "start_time": start_time, "end_time": end_time}
+        for (_, title), start_time, end_time in zip(matches, seconds, seconds[1:] + [None])
+    ]
+    
+    logger.info(f"Found {len(chapters)} chapters in description for {video_id}")
+    return chapters
 
 
 # Function to format subtitles with timestamps
@@ -370,14 +759,9 @@ def format_subtitles(subtitles):
     if not subtitles:
         return "No subtitles available."
     
-    formatted_text = ""
-    
-    for entry in subtitles:
-        start_seconds = entry.get('start', 0)
-        minutes, seconds = divmod(int(start_seconds), 60)
-        hours, minutes = divmod(minutes, 60)
-        
-        timestamp = f"[{hours:02d}:{minutes:02d}:{seconds:02d}]"
-        formatted_text += f"{timestamp} {entry.get('text', '')}\n\n"
-    
-    return formatted_text
\ No newline at end of file
+    # Timestamps of all subtitles are computed in one vectorized pass
+    time_strs = format_times_batch([entry.get('start', 0) for entry in subtitles])
+    return "".join(
+        f"[{time_str}] {entry.get('text', '')}\n\n"
+        for entry, time_str in zip(subtitles, time_strs)
+    )
\ No newline at end of file
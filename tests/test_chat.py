@@ -0,0 +1,61 @@
+import asyncio
+import types
+import pytest
+
+chat = pytest.importorskip("src.chat")
+
+
+class _FakeChain:
+    def __init__(self):
+        self.questions = []
+
+    async def aretrieve(self, question, question_vector=None):
+        return []
+
+    async def astream(self, question, docs, history):
+        self.questions.append((question, len(history)))
+        yield f"fresh answer to {question}"
+
+
+def _ask(message, history):
+    async def collect():
+        turns = None
+        async for turns in chat.chat_with_subtitles(message, history, "huggingface"):
+            pass
+        return turns
+    return asyncio.run(collect())
+
+
+@pytest.fixture
+def fake_app_state(monkeypatch):
+    chain = _FakeChain()
+    embeddings = types.SimpleNamespace(embed_query=lambda question: [1.0, 0.0, 0.0])
+    monkeypatch.setattr(chat.app_state, "qa_chain", chain)
+    monkeypatch.setattr(chat.app_state, "vectordb", types.SimpleNamespace(embeddings=embeddings))
+    monkeypatch.setattr(chat.app_state, "video_info", {"video_id": "video"})
+    monkeypatch.setattr(chat.app_state, "current_model", "huggingface")
+    chat.query_cache.clear()
+    chat.semantic_cache.clear()
+    yield chain
+    chat.query_cache.clear()
+    chat.semantic_cache.clear()
+
+
+def test_near_duplicate_follow_up_with_history_misses_semantic_cache(fake_app_state):
+    # Cached answer of an opening question with the same embedding
+    chat.semantic_cache.set(("video", "huggingface"), [1.0, 0.0, 0.0], ("cached answer", []))
+
+    history = [["What are the two methods?", "Gradient descent and Newton's method."]]
+    turns = _ask("And the second one?", history)
+
+    assert turns[-1][1] == "fresh answer to And the second one?"
+    assert fake_app_state.questions == [("And the second one?", 1)]
+
+
+def test_near_duplicate_opening_question_hits_semantic_cache(fake_app_state):
+    chat.semantic_cache.set(("video", "huggingface"), [1.0, 0.0, 0.0], ("cached answer", []))
+
+    turns = _ask("What is this video about?", [])
+
+    assert turns[-1][1] == "cached answer"
+    assert fake_app_state.questions == []
@@ -0,0 +1,36 @@
+import pytest
+
+translation = pytest.importorskip("src.translation")
+
+
+def _fake_translate_all(texts, model_name, desc="Translating subtitles"):
+    suffix = model_name.rsplit("-", 2)[-2:]
+    return [f"{text}|{'-'.join(suffix)}" for text in texts]
+
+
+def test_pivot_translation_maps_back_to_original_lines(monkeypatch):
+    monkeypatch.setattr(translation, "_translation_model_exists", lambda model_name: not model_name.endswith("de-it"))
+    monkeypatch.setattr(translation, "_translate_all", _fake_translate_all)
+
+    subtitles = [
+        {"start": 0.0, "text": "Hallo"},
+        {"start": 1.0, "text": "Welt"},
+        {"start": 2.0, "text": "Hallo"},
+    ]
+    result = translation.translate_subtitles(subtitles, "de", "it")
+
+    assert [item["translated_text"] for item in result] == [
+        "Hallo|de-en|en-it",
+        "Welt|de-en|en-it",
+        "Hallo|de-en|en-it",
+    ]
+    assert [item["text"] for item in result] == ["Hallo", "Welt", "Hallo"]
+
+
+def test_direct_translation(monkeypatch):
+    monkeypatch.setattr(translation, "_translation_model_exists", lambda model_name: True)
+    monkeypatch.setattr(translation, "_translate_all", _fake_translate_all)
+
+    result = translation.translate_subtitles([{"start": 0.0, "text": "Hallo"}], "de", "en")
+
+    assert result[0]["translated_text"] == "Hallo|de-en"